@@ -0,0 +1,99 @@
+"""Measure time and queries of saving a large experiment in the editor.
+
+Runs against a temporary test database, filled with a synthetic study.
+
+Usage: python -m benchmarks.experiment_save [--participants N] [--tasks N]
+"""
+
+import argparse
+import os
+import time
+import uuid
+from typing import Optional
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "okra_server.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from okra_server.models import Experiment, Participant, TaskType  # noqa: E402
+
+
+def get_data(
+    participants, n_tasks: int, n_assigned: Optional[int] = None, reverse: bool = False
+) -> dict:
+    labels = [f"task-{i}" for i in range(n_tasks)]
+    assigned_labels = labels[:n_assigned]
+    if reverse:
+        assigned_labels.reverse()
+    return {
+        "taskType": TaskType.QUESTION_ANSWERING,
+        "title": "Benchmark",
+        "instructions": "",
+        "instructionsAfterTask": "",
+        "instructionsAfterPracticeTask": "",
+        "instructionsAfterFinalTask": "",
+        "practiceTask": None,
+        "tasks": [
+            {
+                "id": str(uuid.UUID(int=i + 1)),
+                "label": label,
+                "data": {"question": label, "answers": ["a", "b", "c"]},
+            }
+            for i, label in enumerate(labels)
+        ],
+        "ratings": [],
+        "assignments": {
+            str(participant.id): [{"label": label} for label in assigned_labels]
+            for participant in participants
+        },
+    }
+
+
+def measure(client: Client, url: str, data: dict):
+    with CaptureQueriesContext(connection) as queries:
+        start_time = time.perf_counter()
+        response = client.post(url, data, content_type="application/json")
+        duration = time.perf_counter() - start_time
+    assert response.status_code == 200, response.content
+    return duration, len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=100)
+    parser.add_argument("--tasks", type=int, default=200)
+    args = parser.parse_args()
+
+    settings.ALLOWED_HOSTS = ["testserver"]
+    settings.DATA_UPLOAD_MAX_MEMORY_SIZE = None
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        client = Client()
+        client.force_login(User.objects.create_superuser("benchmark"))
+        participants = Participant.create_batch(args.participants, "participant-")
+        url = f"/experiments/{Experiment.objects.create().id}"
+        print(f"Assignments: {args.participants * args.tasks}")
+        for name, data in [
+            ("Create", get_data(participants, args.tasks)),
+            ("Save unchanged", get_data(participants, args.tasks)),
+            (
+                "Remove half of the assignments",
+                get_data(participants, args.tasks, n_assigned=args.tasks // 2),
+            ),
+            ("Reorder assignments", get_data(participants, args.tasks, reverse=True)),
+        ]:
+            duration, n_queries = measure(client, url, data)
+            print(f"{name}: {duration:.1f} s, {n_queries} queries")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compare the JSON backends on a results export payload.
+
+Usage: python -m benchmarks.json_encoders [--participants N] [--tasks N] [--events N]
+"""
+
+import argparse
+import os
+import timeit
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "okra_server.settings")
+django.setup()
+
+from okra_server.serialization import JSON_BACKENDS, orjson  # noqa: E402
+
+
+def make_results_payload(n_participants: int, n_tasks: int, n_events: int) -> dict:
+    """Build a payload shaped like the output of `experiment_results`."""
+    start_time = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+    def make_task(i):
+        return {
+            "id": uuid.uuid4(),
+            "label": f"task-{i}",
+            "results": {
+                "data": {"answers": [0, 2, 1], "ratings": [3, 4]},
+                "events": [
+                    {
+                        "time": (start_time + timedelta(milliseconds=j * 137))
+                        .isoformat()
+                        .replace("+00:00", "Z"),
+                        "label": f"event-{j % 7}",
+                        "data": {"index": j, "correct": j % 3 == 0},
+                    }
+                    for j in range(n_events)
+                ],
+            },
+            "startedTime": start_time,
+            "finishedTime": start_time + timedelta(minutes=5),
+        }
+
+    return {
+        "experiment": {
+            "id": uuid.uuid4(),
+            "title": "Benchmark experiment",
+            "taskType": "reading",
+        },
+        "results": [
+            {
+                "participant": {"id": uuid.uuid4(), "label": f"participant-{i}"},
+                "practiceTasks": [make_task(0)],
+                "tasks": [make_task(j) for j in range(n_tasks)],
+            }
+            for i in range(n_participants)
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_results_payload(args.participants, args.tasks, args.events)
+    baseline = None
+    for name, dumps in JSON_BACKENDS.items():
+        if name == "orjson" and orjson is None:
+            print(f"{name}: not installed")
+            continue
+        size = len(dumps(data))
+        seconds = min(timeit.repeat(lambda: dumps(data), number=1, repeat=args.repeat))
+        baseline = baseline or seconds
+        print(
+            f"{name}: {seconds * 1000:.1f} ms, {size / 1e6:.1f} MB "
+            f"({baseline / seconds:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Compare time and peak memory of exporting the results of a large experiment.
+
+Runs against a temporary test database, filled with a synthetic study.
+
+Usage: python -m benchmarks.results_export [--participants N] [--tasks N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "okra_server.settings")
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from okra_server import export  # noqa: E402
+from okra_server.models import (  # noqa: E402
+    Experiment,
+    Participant,
+    ProgressCounter,
+    Task,
+    TaskAssignment,
+    TaskAssignmentResults,
+    TaskType,
+)
+from okra_server.serialization import JsonResponse  # noqa: E402
+
+
+def create_study(n_participants: int, n_tasks: int) -> Experiment:
+    experiment = Experiment.objects.create(
+        task_type=TaskType.QUESTION_ANSWERING,
+        title="Benchmark",
+        instructions="",
+        practice_task=Task.objects.create(data={}),
+    )
+    tasks = Task.objects.bulk_create(
+        Task(experiment=experiment, label=f"task-{i}", data={}) for i in range(n_tasks)
+    )
+    participants = Participant.create_batch(n_participants, "participant-")
+    now = timezone.now()
+    results = {
+        "data": {"answers": [0, 2, 1]},
+        "events": [
+            {"time": f"2023-01-01T10:00:{i:02}.000Z", "label": "scroll", "data": i}
+            for i in range(20)
+        ],
+    }
+    for participant in participants:
+        TaskAssignment.objects.bulk_create(
+            TaskAssignment(
+                participant=participant,
+                task=task,
+                started_time=now,
+                finished_time=now,
+            )
+            for task in tasks
+        )
+        # Fetched again, since primary keys are not set by `bulk_create` on SQLite
+        assignments = list(participant.assignments.all())
+        for assignment in assignments:
+            assignment.set_results(results)
+        TaskAssignment.objects.bulk_update(assignments, ["results"])
+        TaskAssignmentResults.store(assignments)
+    ProgressCounter.rebuild([experiment.id])
+    return experiment
+
+
+def export_in_memory(experiment: Experiment) -> int:
+    """The previous implementation, building the whole export before encoding."""
+    data = {
+        "experiment": {
+            "id": experiment.id,
+            "title": experiment.title,
+            "taskType": experiment.task_type,
+        },
+        "results": [
+            {
+                "participant": {"id": participant.id, "label": participant.label},
+                "practiceTasks": [
+                    export._serialize_assignment(assignment)
+                    for assignment in experiment.get_assignments(
+                        participant, practice=True
+                    ).select_related("task", "compressed_results")
+                ],
+                "tasks": [
+                    export._serialize_assignment(assignment)
+                    for assignment in experiment.get_assignments(
+                        participant
+                    ).select_related("task", "compressed_results")
+                ],
+            }
+            for participant in Participant.objects.all()
+        ],
+    }
+    return len(JsonResponse(data).content)
+
+
+def export_to_file(experiment: Experiment) -> int:
+    with tempfile.TemporaryFile() as file:
+        export.write_experiment_results(experiment, file)
+        return file.tell()
+
+
+def measure(function, experiment: Experiment):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    size = function(experiment)
+    duration = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, duration, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=1000)
+    parser.add_argument("--tasks", type=int, default=100)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        experiment = create_study(args.participants, args.tasks)
+        print(f"Assignments: {args.participants * args.tasks}")
+        for name, function in [
+            ("JsonResponse", export_in_memory),
+            ("write_experiment_results", export_to_file),
+        ]:
+            size, duration, peak = measure(function, experiment)
+            print(
+                f"{name}: {size / 1e6:.1f} MB in {duration:.1f} s, "
+                f"peak memory {peak / 1e6:.1f} MB"
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Compare peak memory of parsing a large `finish_task` request body.
+
+Usage: python -m benchmarks.upload_memory [--events N]
+"""
+
+import argparse
+import json
+import os
+import tracemalloc
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "okra_server.settings")
+django.setup()
+
+from django.test import RequestFactory, override_settings  # noqa: E402
+
+from okra_server.serialization import load_body, orjson  # noqa: E402
+
+
+def make_results_body(n_events: int) -> bytes:
+    """Build a body shaped like the results of a long reading task."""
+    return json.dumps(
+        {
+            "data": {"answers": [0, 2, 1]},
+            "events": [
+                {
+                    "time": f"2023-01-01T10:{i // 60000 % 60:02}:{i // 1000 % 60:02}."
+                    f"{i % 1000:03}Z",
+                    "label": "scroll",
+                    "data": {"offset": i * 3.5, "visibleSegments": [i, i + 1, i + 2]},
+                }
+                for i in range(n_events)
+            ],
+        }
+    ).encode()
+
+
+def measure(parse, body: bytes) -> int:
+    # The request is created before tracing, since the server holds the incoming
+    # body in any case
+    request = RequestFactory().post(
+        "/api/tasks/task_id/finish", body, content_type="application/json"
+    )
+    tracemalloc.start()
+    data = parse(request)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=50000)
+    args = parser.parse_args()
+
+    body = make_results_body(args.events)
+    print(f"Body size: {len(body) / 1e6:.1f} MB")
+
+    def parse_body(request):
+        return load_body(request, len(body), len(body))
+
+    with override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=None):
+        peak = measure(lambda request: json.loads(request.body), body)
+    print(f"json.loads(request.body): {peak / 1e6:.1f} MB")
+    for backend in ["django", "orjson"]:
+        if backend == "orjson" and orjson is None:
+            print(f"load_body ({backend}): not installed")
+            continue
+        with override_settings(JSON_BACKEND=backend):
+            peak = measure(parse_body, body)
+        print(f"load_body ({backend}): {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,9 @@ urlpatterns = [
     path("register", views.register),
     path("experiments", views.get_experiments),
     path("experiments/<experiment_id>", views.get_experiment),
+    path("experiments/<experiment_id>/bundle", views.get_experiment_bundle),
     path("experiments/<experiment_id>/start", views.start_task),
+    path("task-data/<data_hash>", views.get_task_data),
+    path("tasks/finish", views.finish_tasks),
     path("tasks/<task_id>/finish", views.finish_task),
 ]
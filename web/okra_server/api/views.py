@@ -1,14 +1,32 @@
+import asyncio
 import json
+import uuid
+from datetime import timedelta
 from functools import wraps
+from typing import Callable, Optional
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, router, transaction
 from django.http.request import HttpRequest
-from django.http.response import HttpResponseBadRequest, JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.http.response import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+)
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from okra_server import exceptions, models, task_files
+from okra_server.credentials import credential_cache
+from okra_server.serialization import JsonResponse, load_body
 
-from okra_server import exceptions, models
+BUNDLE_VERSION = 1
+# Task data files are named after their content, so they never change
+TASK_DATA_CACHE_CONTROL = "private, max-age=31536000, immutable"
 
 MISSING_HEADERS_RESPONSE = JsonResponse(
     {
@@ -22,6 +40,18 @@ INVALID_CREDENTIALS_RESPONSE = JsonResponse(
     },
     status=401,
 )
+REQUEST_BODY_TOO_LARGE_RESPONSE = JsonResponse(
+    {
+        "error": "Request body too large",
+    },
+    status=413,
+)
+IDEMPOTENCY_KEY_REUSED_RESPONSE = JsonResponse(
+    {
+        "error": "Idempotency key reused",
+    },
+    status=422,
+)
 NOT_FOUND_RESPONSE = JsonResponse(
     {
         "error": "Not found",
@@ -36,12 +66,44 @@ NO_ASSIGNABLE_TASKS_RESPONSE = JsonResponse(
 )
 
 
-def api_view(method: str, check_credentials: bool = False, query_params: bool = False):
+def api_view(
+    method: str,
+    check_credentials: bool = False,
+    query_params: bool = False,
+    etag: Optional[Callable[..., str]] = None,
+    idempotent: bool = False,
+):
+    """Decorate an API view.
+
+    The resulting view is asynchronous. Views may be coroutine functions, other
+    views (which typically use the ORM) are run in a worker thread as a whole, so
+    that a request does not occupy a thread while its body is received or its
+    response is sent.
+
+    If `etag` is given, it is called with the participant and the URL arguments
+    (and `query_params` if set) before the view, and requests with a matching
+    `If-None-Match` header are answered with 304 Not Modified without calling the
+    view.
+
+    If `idempotent` is set (requires `check_credentials`), successful responses to
+    requests with an `Idempotency-Key` header are stored for
+    `API_IDEMPOTENCY_KEY_TTL` seconds. Retries with the same key are answered with
+    the stored response without reading the request body or calling the view.
+    """
+
     def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            view_func = view
+        else:
+            view_func = sync_to_async(view)
+        if etag is not None:
+            etag_func = sync_to_async(etag)
+
         @wraps(view)
-        @require_http_methods([method])
-        @csrf_exempt
-        def inner(request: HttpRequest, *args, **kwargs):
+        async def inner(request: HttpRequest, *args, **kwargs):
+            if request.method != method:
+                return HttpResponseNotAllowed([method])
+
             participant = None
             if check_credentials:
                 participant_id = request.headers.get("X-Participant-ID")
@@ -49,52 +111,166 @@ def api_view(method: str, check_credentials: bool = False, query_params: bool =
                 if not participant_id or not device_key:
                     return MISSING_HEADERS_RESPONSE
 
+                participant = await _authenticate(participant_id, device_key)
+                if participant is None:
+                    return INVALID_CREDENTIALS_RESPONSE
+
+            idempotency_key = None
+            if idempotent and participant is not None:
+                idempotency_key = request.headers.get("Idempotency-Key")
+                if idempotency_key is not None:
+                    if not idempotency_key or len(idempotency_key) > 255:
+                        return HttpResponseBadRequest()
+                    response = await sync_to_async(_get_idempotent_response)(
+                        participant, idempotency_key, request.path
+                    )
+                    if response is not None:
+                        return response
+
+            if query_params:
+                kwargs["query_params"] = request.GET
+
+            response_etag = None
+            if etag is not None:
                 try:
-                    participant = models.Participant.objects.get(
-                        id=participant_id, device_key=device_key
+                    response_etag = quote_etag(
+                        await etag_func(participant, *args, **kwargs)
                     )
-                except (models.Participant.DoesNotExist, ValidationError):
-                    return INVALID_CREDENTIALS_RESPONSE
+                except ValidationError:
+                    # Invalid URL arguments are left for the view to handle
+                    pass
+                else:
+                    response = get_conditional_response(request, etag=response_etag)
+                    if response is not None:
+                        response["ETag"] = response_etag
+                        return response
 
             if request.method == "GET":
                 data = request.GET
 
-            elif request.method == "POST" and request.body:
+            elif request.method == "POST":
                 try:
-                    data = json.loads(request.body)
+                    data = await sync_to_async(load_body, thread_sensitive=False)(
+                        request,
+                        _get_content_length(request),
+                        settings.API_MAX_BODY_SIZES.get(
+                            view.__name__, settings.API_MAX_BODY_SIZE
+                        ),
+                    )
+                except exceptions.RequestBodyTooLarge:
+                    return REQUEST_BODY_TOO_LARGE_RESPONSE
                 except json.JSONDecodeError:
                     return HttpResponseBadRequest()
+                if data is None:
+                    data = {}
 
             else:
                 data = {}
 
-            if query_params:
-                kwargs["query_params"] = request.GET
-
-            return view(data, *args, participant=participant, **kwargs)
+            response = await view_func(data, *args, participant=participant, **kwargs)
+            if response_etag is not None and response.status_code == 200:
+                response["ETag"] = response_etag
+            if idempotency_key is not None and 200 <= response.status_code < 300:
+                await sync_to_async(_store_idempotent_response)(
+                    participant, idempotency_key, request.path, response
+                )
+            return response
 
+        inner.csrf_exempt = True
         return inner
 
     return decorator
 
 
-def _serialize_experiment(
-    experiment: models.Experiment, participant: models.Participant
-) -> dict:
+def _get_content_length(request: HttpRequest) -> Optional[int]:
+    # Missing (e.g. chunked requests) or invalid lengths are left to `load_body`
+    try:
+        return int(request.META["CONTENT_LENGTH"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _get_idempotent_response(
+    participant: models.Participant, key: str, path: str
+) -> Optional[HttpResponse]:
+    expiry_time = timezone.now() - timedelta(seconds=settings.API_IDEMPOTENCY_KEY_TTL)
+    stored = (
+        participant.idempotency_keys.filter(key=key, created_time__gt=expiry_time)
+        .values_list("path", "status", "response")
+        .first()
+    )
+    if stored is None:
+        return None
+    stored_path, status, content = stored
+    if stored_path != path:
+        return IDEMPOTENCY_KEY_REUSED_RESPONSE
+    response = HttpResponse(
+        bytes(content), status=status, content_type="application/json"
+    )
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _store_idempotent_response(
+    participant: models.Participant, key: str, path: str, response: HttpResponse
+):
+    expiry_time = timezone.now() - timedelta(seconds=settings.API_IDEMPOTENCY_KEY_TTL)
+    participant.idempotency_keys.filter(key=key, created_time__lte=expiry_time).delete()
+    try:
+        with transaction.atomic():
+            participant.idempotency_keys.create(
+                key=key,
+                path=path,
+                status=response.status_code,
+                response=response.content,
+            )
+    except IntegrityError:
+        # A concurrent request with the same key has stored its response first
+        pass
+
+
+async def _authenticate(
+    participant_id: str, device_key: str
+) -> Optional[models.Participant]:
+    try:
+        participant_id = str(uuid.UUID(str(participant_id)))
+    except ValueError:
+        return None
+
+    field_names = [field.attname for field in models.Participant._meta.concrete_fields]
+    values = credential_cache.get(participant_id, device_key)
+    if values is None:
+        values = await sync_to_async(
+            models.Participant.objects.filter(id=participant_id, device_key=device_key)
+            .values_list(*field_names)
+            .first
+        )()
+        if values is None:
+            return None
+        credential_cache.set(participant_id, device_key, values)
+    return models.Participant.from_db(
+        router.db_for_read(models.Participant), field_names, values
+    )
+
+
+def _serialize_experiment(experiment: models.Experiment) -> dict:
+    # Expects an experiment from `Participant.experiments` (annotated with counts)
     return {
         "id": experiment.id,
         "type": experiment.task_type,
         "title": experiment.title,
         "coverImageUrl": experiment.cover_image_url,
         "instructions": experiment.instructions,
-        "nTasks": experiment.get_n_tasks(participant),
-        "nTasksDone": experiment.get_n_tasks(participant, started=True),
-        "hasPracticeTask": experiment.practice_task is not None,
+        "nTasks": experiment.n_tasks,
+        "nTasksDone": experiment.n_tasks_done,
+        "hasPracticeTask": experiment.practice_task_id is not None,
         "ratings": [_serialize_rating(rating) for rating in experiment.ratings.all()],
     }
 
 
-def _serialize_task(task: models.Task, *, is_final: bool) -> dict:
+def _serialize_task(
+    task: models.Task, *, is_final: bool, data_reference: bool = False
+) -> dict:
     if task.is_practice:
         instructions_after = (
             task.practice_experiment.instructions_after_practice_task
@@ -108,11 +284,16 @@ def _serialize_task(task: models.Task, *, is_final: bool) -> dict:
     else:
         instructions_after = task.experiment.instructions_after_task
 
-    return {
+    serialized_task = {
         "id": task.id,
-        "data": task.data,
         "instructionsAfter": instructions_after or None,
     }
+    if data_reference and task_files.is_enabled():
+        # The data can be fetched from `task-data/<dataHash>`
+        serialized_task["dataHash"] = task_files.write_task_data_file(task)
+    else:
+        serialized_task["data"] = task.get_data()
+    return serialized_task
 
 
 def _serialize_rating(rating: models.TaskRating) -> dict:
@@ -125,7 +306,7 @@ def _serialize_rating(rating: models.TaskRating) -> dict:
 
 
 @api_view("GET")
-def base(data: dict, **kwargs):
+async def base(data: dict, **kwargs):
     return JsonResponse(
         {
             "name": settings.API_INFO["name"],
@@ -159,20 +340,19 @@ def register(data: dict, **kwargs):
     )
 
 
-@api_view("GET", check_credentials=True)
+@api_view("GET", check_credentials=True, etag=models.Participant.get_experiments_etag)
 def get_experiments(data: dict, participant: models.Participant):
     return JsonResponse(
         {
             "experiments": [
-                _serialize_experiment(experiment, participant)
-                for experiment in participant.experiments
-                if experiment.is_available(participant)
+                _serialize_experiment(experiment)
+                for experiment in participant.get_available_experiments()
             ],
         }
     )
 
 
-@api_view("GET", check_credentials=True)
+@api_view("GET", check_credentials=True, etag=models.Participant.get_experiments_etag)
 def get_experiment(data: dict, experiment_id: str, participant: models.Participant):
     try:
         experiment = participant.experiments.get(id=experiment_id)
@@ -180,7 +360,7 @@ def get_experiment(data: dict, experiment_id: str, participant: models.Participa
             return NOT_FOUND_RESPONSE
     except models.Experiment.DoesNotExist:
         return NOT_FOUND_RESPONSE
-    return JsonResponse(_serialize_experiment(experiment, participant))
+    return JsonResponse(_serialize_experiment(experiment))
 
 
 @api_view("POST", check_credentials=True, query_params=True)
@@ -201,10 +381,103 @@ def start_task(
         return NO_ASSIGNABLE_TASKS_RESPONSE
     n_tasks = experiment.get_n_tasks(participant)
     n_tasks_done = experiment.get_n_tasks(participant, started=True)
-    return JsonResponse(_serialize_task(task, is_final=n_tasks_done == n_tasks))
+    return JsonResponse(
+        _serialize_task(
+            task,
+            is_final=n_tasks_done == n_tasks,
+            data_reference=query_params.get("dataReference") == "true",
+        )
+    )
+
+
+def _get_experiment_bundle_etag(
+    participant: models.Participant, experiment_id: str, query_params: dict
+) -> str:
+    return participant.get_experiment_bundle_etag(
+        experiment_id, query_params.get("dataReference") == "true"
+    )
+
+
+@api_view(
+    "GET",
+    check_credentials=True,
+    query_params=True,
+    etag=_get_experiment_bundle_etag,
+)
+def get_experiment_bundle(
+    data: dict,
+    experiment_id: str,
+    participant: models.Participant,
+    query_params: dict,
+):
+    try:
+        experiment = participant.experiments.select_related(
+            "practice_task__shared_data"
+        ).get(id=experiment_id)
+        if not experiment.is_available(participant):
+            return NOT_FOUND_RESPONSE
+    except models.Experiment.DoesNotExist:
+        return NOT_FOUND_RESPONSE
+
+    # Same order in which `start_task` would hand out the tasks
+    tasks = [
+        assignment.task
+        for assignment in experiment.get_assignments(participant)
+        .filter(started_time__isnull=True)
+        .defer("results")
+        .select_related(
+            "task__experiment", "task__practice_experiment", "task__shared_data"
+        )
+    ]
+    n_tasks_done = experiment.n_tasks_done
+    data_reference = query_params.get("dataReference") == "true"
+    return JsonResponse(
+        {
+            "version": BUNDLE_VERSION,
+            "experiment": _serialize_experiment(experiment),
+            "practiceTask": (
+                _serialize_task(
+                    experiment.practice_task,
+                    is_final=False,
+                    data_reference=data_reference,
+                )
+                if experiment.practice_task is not None
+                else None
+            ),
+            "tasks": [
+                _serialize_task(
+                    task,
+                    is_final=n_tasks_done + i + 1 == experiment.n_tasks,
+                    data_reference=data_reference,
+                )
+                for i, task in enumerate(tasks)
+            ],
+        }
+    )
+
+
+@api_view("GET", check_credentials=True)
+def get_task_data(data: dict, data_hash: str, participant: models.Participant):
+    # Files are only known by their hash, which is handed out by `_serialize_task`
+    if not task_files.is_enabled():
+        return NOT_FOUND_RESPONSE
+    path = task_files.get_path(data_hash)
+    if path is None or not path.is_file():
+        return NOT_FOUND_RESPONSE
+    if settings.TASK_DATA_ACCEL_REDIRECT_URL:
+        response = HttpResponse(content_type="application/json")
+        response["X-Accel-Redirect"] = (
+            settings.TASK_DATA_ACCEL_REDIRECT_URL.rstrip("/")
+            + "/"
+            + task_files.get_relative_path(data_hash)
+        )
+    else:
+        response = FileResponse(open(path, "rb"), content_type="application/json")
+    response["Cache-Control"] = TASK_DATA_CACHE_CONTROL
+    return response
 
 
-@api_view("POST", check_credentials=True)
+@api_view("POST", check_credentials=True, idempotent=True)
 def finish_task(data: dict, task_id: str, participant: models.Participant):
     try:
         task = models.Task.objects.get(id=task_id)
@@ -212,3 +485,40 @@ def finish_task(data: dict, task_id: str, participant: models.Participant):
     except (models.Task.DoesNotExist, models.TaskAssignment.DoesNotExist):
         return NOT_FOUND_RESPONSE
     return JsonResponse({})
+
+
+@api_view("POST", check_credentials=True, idempotent=True)
+def finish_tasks(data: dict, participant: models.Participant):
+    if not isinstance(data, dict):
+        return HttpResponseBadRequest()
+    tasks_data = data.get("tasks")
+    if not isinstance(tasks_data, list) or not all(
+        isinstance(task_data, dict) and "id" in task_data for task_data in tasks_data
+    ):
+        return HttpResponseBadRequest()
+
+    task_ids = []
+    results = {}
+    for task_data in tasks_data:
+        try:
+            task_id = uuid.UUID(str(task_data["id"]))
+        except ValueError:
+            task_id = None
+        else:
+            results.setdefault(task_id, task_data.get("results"))
+        task_ids.append(task_id)
+    finished_task_ids = {
+        assignment.task_id for assignment in participant.finish_tasks(results)
+    }
+
+    response_data = []
+    for task_data, task_id in zip(tasks_data, task_ids):
+        if task_id in finished_task_ids:
+            # Only the first occurrence of a task ID counts as finished
+            finished_task_ids.remove(task_id)
+            response_data.append({"id": task_data["id"], "status": 200})
+        else:
+            response_data.append(
+                {"id": task_data["id"], "status": 404, "error": "Not found"}
+            )
+    return JsonResponse({"tasks": response_data})
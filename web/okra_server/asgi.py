@@ -1,7 +1,15 @@
 import os
 
+from asgiref.sync import ThreadSensitiveContext
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "okra_server.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    # Give each request its own thread for synchronous code (e.g. ORM calls),
+    # instead of one thread shared by all concurrent requests of the process
+    async with ThreadSensitiveContext():
+        await django_application(scope, receive, send)
@@ -0,0 +1,98 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialCache:
+    """Bounded LRU cache of verified participant credentials with expiry.
+
+    Entries are keyed by participant ID and only returned if the device key matches
+    the one that was verified. The cache is local to the process, so every worker
+    keeps its own entries and counters. `invalidate` only reaches the current
+    process: credentials revoked elsewhere (another worker or a management command)
+    are accepted by other workers until their entries expire after `ttl` seconds.
+
+    If `stats_interval` is positive, the counters are logged at most that often (in
+    seconds), when the cache is used.
+    """
+
+    def __init__(self, max_size: int, ttl: float, stats_interval: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats_interval = stats_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_stats_time = time.monotonic() + stats_interval
+
+    def get(self, participant_id: str, device_key: str) -> Optional[Any]:
+        with self._lock:
+            value = None
+            entry = self._entries.get(participant_id)
+            if entry is not None:
+                cached_device_key, cached_value, expiry_time = entry
+                if expiry_time <= time.monotonic():
+                    del self._entries[participant_id]
+                elif cached_device_key == device_key:
+                    self._entries.move_to_end(participant_id)
+                    value = cached_value
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            log_stats = (
+                self.stats_interval > 0 and time.monotonic() >= self._next_stats_time
+            )
+            if log_stats:
+                self._next_stats_time = time.monotonic() + self.stats_interval
+        if log_stats:
+            logger.info("Credential cache of process %d: %s", os.getpid(), self.stats())
+        return value
+
+    def set(self, participant_id: str, device_key: str, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[participant_id] = (
+                device_key,
+                value,
+                time.monotonic() + self.ttl,
+            )
+            self._entries.move_to_end(participant_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, participant_id: str):
+        with self._lock:
+            self._entries.pop(participant_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+
+credential_cache = CredentialCache(
+    max_size=settings.API_CREDENTIAL_CACHE["max_size"],
+    ttl=settings.API_CREDENTIAL_CACHE["ttl"],
+    stats_interval=settings.API_CREDENTIAL_CACHE["stats_interval"],
+)
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+from typing import Iterable, List
+
+
+def _parse_time(time: str) -> float:
+    return datetime.fromisoformat(time.replace("Z", "+00:00")).timestamp()
+
+
+def parse_event_times(times: Iterable[str]) -> List[float]:
+    """Convert ISO 8601 event times (e.g. "2023-01-01T10:00:05.123Z") to POSIX
+    timestamps in seconds.
+
+    Events of a task mostly share their date, hour and minute, so this prefix is
+    parsed once per distinct value and only the seconds are converted per event.
+    Other formats fall back to `datetime.fromisoformat`. Raises `ValueError` for
+    invalid times.
+    """
+    minute_timestamps = {}
+    timestamps = []
+    for time in times:
+        if time.endswith("Z") and len(time) >= 20 and time[16] == ":":
+            prefix = time[:16]
+            minute_timestamp = minute_timestamps.get(prefix)
+            if minute_timestamp is None:
+                minute_timestamp = minute_timestamps[prefix] = (
+                    datetime.fromisoformat(prefix)
+                    .replace(tzinfo=timezone.utc)
+                    .timestamp()
+                )
+            timestamps.append(minute_timestamp + float(time[17:-1]))
+        else:
+            timestamps.append(_parse_time(time))
+    return timestamps
+
+
+def get_event_offsets(events: List[dict]) -> List[float]:
+    """Return the times of events in seconds since the first event."""
+    timestamps = parse_event_times(event["time"] for event in events)
+    if not timestamps:
+        return []
+    start_timestamp = timestamps[0]
+    return [timestamp - start_timestamp for timestamp in timestamps]
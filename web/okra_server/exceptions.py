@@ -1,2 +1,14 @@
 class NoTasksAvailable(Exception):
     pass
+
+
+class CyclicRequirements(Exception):
+    pass
+
+
+class RequestBodyTooLarge(Exception):
+    pass
+
+
+class InvalidExperimentData(Exception):
+    pass
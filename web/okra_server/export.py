@@ -0,0 +1,351 @@
+import csv
+import io
+import itertools
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import IO, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from okra_server.events import get_event_offsets
+from okra_server.models import Experiment, Participant, TaskAssignment
+from okra_server.serialization import dumps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+
+def _serialize_assignment(assignment: TaskAssignment) -> dict:
+    return {
+        "id": assignment.task.id,
+        "label": assignment.task.label,
+        "results": assignment.get_results(),
+        "startedTime": assignment.started_time,
+        "finishedTime": assignment.finished_time,
+    }
+
+
+def iter_experiment_results(
+    experiment: Experiment, chunk_size: int = 1000
+) -> Iterator[bytes]:
+    """Encode the results of an experiment as JSON, one participant at a time.
+
+    Participants are read in chunks, together with their assignments, so that a
+    chunk has at most about `chunk_size` assignments (if every participant were
+    assigned every task). Memory use does not grow with the number of participants.
+    """
+    n_tasks = experiment.tasks.count() + (experiment.practice_task_id is not None)
+    participants_per_chunk = max(1, chunk_size // max(1, n_tasks))
+    participants = Participant.objects.order_by("label", "id").iterator(
+        chunk_size=participants_per_chunk
+    )
+    assignments = (
+        TaskAssignment.objects.filter(
+            models.Q(task__experiment=experiment)
+            | models.Q(task_id=experiment.practice_task_id)
+        )
+        .select_related("task", "compressed_results")
+        .order_by("id")
+    )
+
+    header = dumps(
+        {
+            "id": experiment.id,
+            "title": experiment.title,
+            "taskType": experiment.task_type,
+        }
+    )
+    yield b'{"experiment":' + header + b',"results":['
+    i = 0
+    while True:
+        chunk = list(itertools.islice(participants, participants_per_chunk))
+        if not chunk:
+            break
+        # Matched by ID, since labels are ordered by the database collation
+        chunk_assignments = {participant.id: [] for participant in chunk}
+        for assignment in assignments.filter(participant_id__in=chunk_assignments):
+            chunk_assignments[assignment.participant_id].append(assignment)
+        for participant in chunk:
+            practice_tasks = []
+            tasks = []
+            for assignment in chunk_assignments[participant.id]:
+                if assignment.task_id == experiment.practice_task_id:
+                    practice_tasks.append(_serialize_assignment(assignment))
+                else:
+                    tasks.append(_serialize_assignment(assignment))
+            entry = dumps(
+                {
+                    "participant": {
+                        "id": participant.id,
+                        "label": participant.label,
+                    },
+                    "practiceTasks": practice_tasks,
+                    "tasks": tasks,
+                }
+            )
+            yield entry if i == 0 else b"," + entry
+            i += 1
+    yield b"]}"
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def format_cursor(assignment: TaskAssignment) -> str:
+    """Return a cursor pointing after the given finished assignment."""
+    microseconds = (assignment.finished_time - _EPOCH) // timedelta(microseconds=1)
+    return f"{microseconds}-{assignment.id}"
+
+
+def parse_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    """Return the finished time and ID of a cursor (None for an empty cursor,
+    meaning the beginning). Raises `ValueError` if the cursor is invalid."""
+    if not cursor:
+        return None
+    microseconds, assignment_id = cursor.split("-")
+    return _EPOCH + timedelta(microseconds=int(microseconds)), int(assignment_id)
+
+
+def get_finished_since(
+    assignments: models.QuerySet, cursor: str
+) -> models.QuerySet["TaskAssignment"]:
+    """Filter assignments to those finished after a cursor, in cursor order.
+
+    Recent assignments are left out for `RESULTS_EXPORT_SETTLE_TIME` seconds, so
+    that a cursor never skips ones whose transactions have not been committed yet.
+    Raises `ValueError` if the cursor is invalid.
+    """
+    position = parse_cursor(cursor)
+    assignments = assignments.filter(
+        finished_time__lte=timezone.now()
+        - timedelta(seconds=settings.RESULTS_EXPORT_SETTLE_TIME)
+    )
+    if position is not None:
+        finished_time, assignment_id = position
+        assignments = assignments.filter(
+            models.Q(finished_time__gt=finished_time)
+            | models.Q(finished_time=finished_time, id__gt=assignment_id)
+        )
+    return assignments.order_by("finished_time", "id")
+
+
+def iter_experiment_results_since(
+    experiment: Experiment, cursor: str, chunk_size: int = 1000
+) -> Iterator[bytes]:
+    """Encode the results of assignments of an experiment finished after a cursor
+    as JSON, followed by the cursor to continue from."""
+    assignments = get_finished_since(
+        TaskAssignment.objects.filter(
+            models.Q(task__experiment=experiment)
+            | models.Q(task_id=experiment.practice_task_id)
+        ),
+        cursor,
+    ).select_related("task", "participant", "compressed_results")
+
+    header = dumps(
+        {
+            "id": experiment.id,
+            "title": experiment.title,
+            "taskType": experiment.task_type,
+        }
+    )
+    yield b'{"experiment":' + header + b',"results":['
+    for i, assignment in enumerate(assignments.iterator(chunk_size=chunk_size)):
+        entry = dumps(
+            {
+                "participant": {
+                    "id": assignment.participant.id,
+                    "label": assignment.participant.label,
+                },
+                "practice": assignment.task_id == experiment.practice_task_id,
+                **_serialize_assignment(assignment),
+            }
+        )
+        yield entry if i == 0 else b"," + entry
+        cursor = format_cursor(assignment)
+    yield b'],"cursor":' + dumps(cursor) + b"}"
+
+
+def write_experiment_results(
+    experiment: Experiment, file: IO[bytes], since: Optional[str] = None
+):
+    """Write the results of an experiment to a file, only those finished after
+    the cursor `since` if given."""
+    if since is None:
+        chunks = iter_experiment_results(experiment)
+    else:
+        chunks = iter_experiment_results_since(experiment, since)
+    for chunk in chunks:
+        file.write(chunk)
+
+
+EVENT_FILE_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "tsv": "text/tab-separated-values",
+    "parquet": "application/vnd.apache.parquet",
+}
+EVENT_COLUMNS = [
+    "participant_id",
+    "participant_label",
+    "task_id",
+    "task_label",
+    "practice",
+    "event_index",
+    "label",
+    "time",
+    "time_offset",
+]
+
+
+def get_event_file_formats() -> List[str]:
+    """Return the supported event file formats (Parquet requires pyarrow)."""
+    return [
+        file_format
+        for file_format in EVENT_FILE_CONTENT_TYPES
+        if file_format != "parquet" or pyarrow is not None
+    ]
+
+
+def _get_event_assignments(experiment: Experiment) -> models.QuerySet:
+    return (
+        TaskAssignment.objects.filter(
+            models.Q(task__experiment=experiment)
+            | models.Q(task_id=experiment.practice_task_id),
+            finished_time__isnull=False,
+            canceled=False,
+        )
+        .select_related("task", "participant", "compressed_results")
+        .order_by("participant__label", "participant_id", "id")
+    )
+
+
+def get_event_data_columns(experiment: Experiment, sample_size: int = 100) -> List[str]:
+    """Return the payload columns of the event table of an experiment.
+
+    Event data is defined by the app for each task type, so the columns are the
+    keys of object payloads found in the first `sample_size` assignments. Other
+    payloads (and keys missing from the sample) are kept as JSON in a "data"
+    column.
+    """
+    keys = set()
+    for assignment in _get_event_assignments(experiment)[:sample_size]:
+        results = assignment.get_results() or {}
+        for event in results.get("events", []):
+            if isinstance(event.get("data"), dict):
+                keys.update(event["data"])
+    return [f"data.{key}" for key in sorted(keys)] + ["data"]
+
+
+def iter_event_rows(
+    experiment: Experiment, data_columns: List[str], chunk_size: int = 1000
+) -> Iterator[list]:
+    """Return the events of an experiment's finished tasks as rows of
+    `EVENT_COLUMNS` followed by `data_columns`, one row per event."""
+    data_keys = [column[len("data.") :] for column in data_columns[:-1]]
+    for assignment in _get_event_assignments(experiment).iterator(
+        chunk_size=chunk_size
+    ):
+        results = assignment.get_results() or {}
+        events = results.get("events", [])
+        task_columns = [
+            str(assignment.participant_id),
+            assignment.participant.label,
+            str(assignment.task_id),
+            assignment.task.label,
+            assignment.task_id == experiment.practice_task_id,
+        ]
+        for i, (event, time_offset) in enumerate(
+            zip(events, get_event_offsets(events))
+        ):
+            data = event.get("data")
+            if isinstance(data, dict):
+                data = dict(data)
+                data_values = [data.pop(key, None) for key in data_keys]
+                data = data or None
+            else:
+                data_values = [None] * len(data_keys)
+            yield task_columns + [
+                i,
+                event.get("label"),
+                event["time"],
+                time_offset,
+                *data_values,
+                data,
+            ]
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode()
+    return str(value)
+
+
+def _write_delimited(rows: Iterator[list], columns: List[str], file, delimiter):
+    text_file = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    writer = csv.writer(text_file, delimiter=delimiter)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_format_value(value) for value in row])
+    text_file.flush()
+    text_file.detach()
+
+
+def _write_parquet(
+    rows: Iterator[list], columns: List[str], file, batch_size: int = 10000
+):
+    schema = pyarrow.schema(
+        [
+            ("participant_id", pyarrow.string()),
+            ("participant_label", pyarrow.string()),
+            ("task_id", pyarrow.string()),
+            ("task_label", pyarrow.string()),
+            ("practice", pyarrow.bool_()),
+            ("event_index", pyarrow.int64()),
+            ("label", pyarrow.string()),
+            ("time", pyarrow.string()),
+            ("time_offset", pyarrow.float64()),
+        ]
+        # Payload types differ between events, so they are stored as text
+        + [(column, pyarrow.string()) for column in columns[len(EVENT_COLUMNS) :]]
+    )
+    with pyarrow.parquet.ParquetWriter(file, schema) as writer:
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            batch_columns = [list(values) for values in zip(*batch)]
+            for i in range(len(EVENT_COLUMNS), len(columns)):
+                batch_columns[i] = [
+                    None if value is None else _format_value(value)
+                    for value in batch_columns[i]
+                ]
+            writer.write_table(
+                pyarrow.Table.from_arrays(
+                    [
+                        pyarrow.array(values, type=field.type)
+                        for values, field in zip(batch_columns, schema)
+                    ],
+                    schema=schema,
+                )
+            )
+
+
+def write_experiment_events(experiment: Experiment, file: IO[bytes], file_format: str):
+    """Write the events of an experiment's finished tasks to a file in long format
+    (see `iter_event_rows`), as CSV, TSV or Parquet."""
+    data_columns = get_event_data_columns(experiment)
+    columns = EVENT_COLUMNS + data_columns
+    rows = iter_event_rows(experiment, data_columns)
+    if file_format == "parquet":
+        _write_parquet(rows, columns, file)
+    else:
+        _write_delimited(rows, columns, file, "\t" if file_format == "tsv" else ",")
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from okra_server.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete stored API responses whose idempotency keys have expired"
+
+    def handle(self, *args, **options):
+        expiry_time = timezone.now() - timedelta(
+            seconds=settings.API_IDEMPOTENCY_KEY_TTL
+        )
+        n_deleted, _ = IdempotencyKey.objects.filter(
+            created_time__lte=expiry_time
+        ).delete()
+        print(n_deleted)
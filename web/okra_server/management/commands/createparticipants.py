@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandParser
+
+from okra_server.models import Participant
+from okra_server.qr import render_registration_sheet
+
+
+class Command(BaseCommand):
+    help = "Create labeled participants and print their registration sheet (HTML)"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument("n", type=int, help="Number of participants")
+        parser.add_argument(
+            "--label-prefix",
+            "-l",
+            default="",
+            help="Label prefix, followed by a running number",
+        )
+        parser.add_argument(
+            "--base-url",
+            "-u",
+            required=True,
+            help="API URL encoded in the QR codes (e.g. https://my-host.com/api)",
+        )
+        parser.add_argument(
+            "--format",
+            "-f",
+            choices=["svg", "png"],
+            default=settings.QR_CODE_FORMAT,
+            help="QR code image format",
+        )
+
+    def handle(self, *args, **options):
+        participants = Participant.create_batch(options["n"], options["label_prefix"])
+        print(
+            render_registration_sheet(
+                options["base_url"].rstrip("/"),
+                participants,
+                options["format"],
+                parallel=True,
+            )
+        )
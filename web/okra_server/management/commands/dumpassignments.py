@@ -1,7 +1,8 @@
 import json
 
-from django.core.management import BaseCommand, CommandParser
+from django.core.management import BaseCommand, CommandError, CommandParser
 
+from okra_server.export import format_cursor, get_finished_since
 from okra_server.models import Experiment, Participant, TaskAssignment
 
 
@@ -11,16 +12,30 @@ class Command(BaseCommand):
     def add_arguments(self, parser: CommandParser):
         parser.add_argument("--participant", "-p", help="Participant ID")
         parser.add_argument("--experiment", "-e", help="Experiment ID")
+        parser.add_argument(
+            "--since",
+            "-s",
+            help="Only dump assignments finished after this cursor (empty for all "
+            "finished ones) and write the cursor to continue from to stderr",
+        )
 
     def handle(self, *args, **options):
-        assignments = TaskAssignment.objects.all()
+        assignments = TaskAssignment.objects.select_related(
+            "task__experiment", "task__practice_experiment", "compressed_results"
+        )
         if options["participant"] is not None:
             participant = Participant.objects.get(id=options["participant"])
             assignments = assignments.filter(participant=participant)
         if options["experiment"] is not None:
             experiment = Experiment.objects.get(id=options["experiment"])
             assignments = assignments.filter(task__experiment=experiment)
-        for assignment in assignments:
+        cursor = options["since"]
+        if cursor is not None:
+            try:
+                assignments = get_finished_since(assignments, cursor)
+            except ValueError:
+                raise CommandError(f"Invalid cursor: {cursor}")
+        for assignment in assignments.iterator():
             experiment = (
                 assignment.task.experiment or assignment.task.practice_experiment
             )
@@ -28,7 +43,7 @@ class Command(BaseCommand):
                 json.dumps(
                     {
                         "assignmentId": str(assignment.id),
-                        "participantId": str(assignment.participant.id),
+                        "participantId": str(assignment.participant_id),
                         "taskId": str(assignment.task.id),
                         "taskLabel": assignment.task.label,
                         "experimentId": str(experiment.id),
@@ -44,7 +59,11 @@ class Command(BaseCommand):
                             if assignment.finished_time is not None
                             else None
                         ),
-                        "results": assignment.results,
+                        "results": assignment.get_results(),
                     }
                 )
             )
+            if cursor is not None:
+                cursor = format_cursor(assignment)
+        if cursor is not None:
+            self.stderr.write(cursor)
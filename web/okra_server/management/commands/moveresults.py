@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand, CommandParser
+
+from okra_server.models import TaskAssignment, TaskAssignmentResults
+from okra_server.results import move_results, use_compressed_storage
+
+
+class Command(BaseCommand):
+    help = "Move existing task results to the storage selected in RESULTS_STORAGE"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--batch-size",
+            "-b",
+            type=int,
+            default=100,
+            help="Number of results moved per transaction",
+        )
+
+    def handle(self, *args, **options):
+        n_moved = move_results(
+            TaskAssignment,
+            TaskAssignmentResults,
+            compressed=use_compressed_storage(),
+            batch_size=options["batch_size"],
+        )
+        print(n_moved)
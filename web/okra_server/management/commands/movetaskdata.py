@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandParser
+from django.db import transaction
+
+from okra_server.models import Task, TaskData
+
+
+class Command(BaseCommand):
+    help = "Move existing task data to the storage selected in TASK_DATA_STORAGE"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "--batch-size",
+            "-b",
+            type=int,
+            default=100,
+            help="Number of tasks moved per transaction",
+        )
+
+    def handle(self, *args, **options):
+        if settings.TASK_DATA_STORAGE == "deduplicated":
+            tasks = Task.objects.filter(data__isnull=False)
+        else:
+            tasks = Task.objects.filter(shared_data__isnull=False)
+        task_ids = list(tasks.values_list("id", flat=True))
+        batch_size = options["batch_size"]
+        for i in range(0, len(task_ids), batch_size):
+            with transaction.atomic():
+                for task in Task.objects.filter(
+                    id__in=task_ids[i : i + batch_size]
+                ).select_related("shared_data"):
+                    task.set_data(task.get_data())
+                    task.save()
+        TaskData.delete_unreferenced()
+        print(len(task_ids))
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand, CommandParser
+
+from okra_server.models import ProgressCounter
+
+
+class Command(BaseCommand):
+    help = "Recount the progress counters of experiments from their task assignments"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument(
+            "experiment_ids",
+            nargs="*",
+            help="Experiments to recount (default: all)",
+        )
+
+    def handle(self, *args, **options):
+        n_counters = ProgressCounter.rebuild(options["experiment_ids"] or None)
+        print(n_counters)
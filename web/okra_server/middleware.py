@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+def _compress_sequence_brotli(sequence):
+    compressor = brotli.Compressor()
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class JsonCompressionMiddleware(GZipMiddleware):
+    """Compress JSON responses if enabled in `JSON_RESPONSE_COMPRESSION`.
+
+    Uses brotli if it is installed and accepted by the client, gzip otherwise.
+    Other content types (e.g. HTML pages containing CSRF tokens) are never
+    compressed.
+    """
+
+    def process_response(self, request, response):
+        if not settings.JSON_RESPONSE_COMPRESSION or not response.get(
+            "Content-Type", ""
+        ).startswith("application/json"):
+            return response
+
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if brotli is None or not re_accepts_brotli.search(accept_encoding):
+            return super().process_response(request, response)
+
+        # Same rules as `GZipMiddleware`
+        if not response.streaming and len(response.content) < 200:
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if response.streaming:
+            response.streaming_content = _compress_sequence_brotli(
+                response.streaming_content
+            )
+            del response["Content-Length"]
+        else:
+            compressed_content = brotli.compress(response.content)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response["Content-Length"] = str(len(response.content))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = "br"
+        return response
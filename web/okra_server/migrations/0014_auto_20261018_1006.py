@@ -0,0 +1,23 @@
+# Generated by Django 3.1.7 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0013_auto_20230123_2034'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='experiment',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='assignments_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
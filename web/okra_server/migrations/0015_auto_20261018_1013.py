@@ -0,0 +1,74 @@
+# Generated by Django 3.1.7 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class CyclicRequirements(Exception):
+    pass
+
+
+def _requirement_levels(requirements):
+    # Copied from `okra_server.models` as of this migration, so that later changes
+    # to the models do not affect it
+    levels = {}
+    visiting = set()
+
+    def visit(experiment_id):
+        if experiment_id in levels:
+            return levels[experiment_id]
+        if experiment_id in visiting:
+            raise CyclicRequirements()
+        visiting.add(experiment_id)
+        levels[experiment_id] = max(
+            (
+                visit(required_id) + 1
+                for required_id in requirements.get(experiment_id, ())
+            ),
+            default=0,
+        )
+        visiting.remove(experiment_id)
+        return levels[experiment_id]
+
+    for experiment_id in requirements:
+        visit(experiment_id)
+    return levels
+
+
+def populate(apps, schema_editor):
+    Experiment = apps.get_model("okra_server", "Experiment")
+    # `Participant.incomplete_experiments` is left empty, since it is removed again
+    # in 0022 (availability is read from the progress counters)
+    requirements = {}
+    for from_id, to_id in Experiment.required_experiments.through.objects.values_list(
+        "from_experiment_id", "to_experiment_id"
+    ):
+        if from_id != to_id:
+            requirements.setdefault(from_id, set()).add(to_id)
+    try:
+        levels = _requirement_levels(requirements)
+    except CyclicRequirements:
+        # Existing cycles are reported when the experiment is saved next time
+        return
+    for experiment_id, level in levels.items():
+        Experiment.objects.filter(id=experiment_id).update(requirement_level=level)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0014_auto_20261018_1006'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='experiment',
+            name='requirement_level',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='incomplete_experiments',
+            field=models.ManyToManyField(related_name='incomplete_participants', to='okra_server.Experiment'),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.7 on 2026-10-18 10:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0015_auto_20261018_1013'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('key', models.CharField(max_length=255)),
+                ('path', models.CharField(max_length=255)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('response', models.BinaryField()),
+                ('created_time', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to='okra_server.participant')),
+            ],
+            options={
+                'unique_together': {('participant', 'key')},
+            },
+        ),
+    ]
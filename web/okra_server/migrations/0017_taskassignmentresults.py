@@ -0,0 +1,42 @@
+# Generated by Django 3.1.7 on 2026-10-18 10:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from okra_server.results import move_results, use_compressed_storage
+
+
+def compress_existing_results(apps, schema_editor):
+    if use_compressed_storage():
+        move_results(
+            apps.get_model("okra_server", "TaskAssignment"),
+            apps.get_model("okra_server", "TaskAssignmentResults"),
+            compressed=True,
+        )
+
+
+def decompress_existing_results(apps, schema_editor):
+    move_results(
+        apps.get_model("okra_server", "TaskAssignment"),
+        apps.get_model("okra_server", "TaskAssignmentResults"),
+        compressed=False,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0016_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskAssignmentResults',
+            fields=[
+                ('assignment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='compressed_results', serialize=False, to='okra_server.taskassignment')),
+                ('codec', models.CharField(max_length=10)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.RunPython(compress_existing_results, decompress_existing_results),
+    ]
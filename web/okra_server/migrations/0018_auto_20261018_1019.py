@@ -0,0 +1,26 @@
+# Generated by Django 3.1.7 on 2026-10-18 10:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0017_taskassignmentresults'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskData',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.JSONField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='shared_data',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tasks', to='okra_server.taskdata'),
+        ),
+    ]
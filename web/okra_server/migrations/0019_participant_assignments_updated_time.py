@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0018_auto_20261018_1019'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='assignments_updated_time',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.1.7 on 2026-10-18 10:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from okra_server.progress import aggregate_progress
+
+
+def count_existing_assignments(apps, schema_editor):
+    TaskAssignment = apps.get_model("okra_server", "TaskAssignment")
+    ProgressCounter = apps.get_model("okra_server", "ProgressCounter")
+    ProgressCounter.objects.bulk_create(
+        ProgressCounter(**row)
+        for row in aggregate_progress(TaskAssignment.objects.all())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0019_participant_assignments_updated_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressCounter',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('practice', models.BooleanField()),
+                ('n_assigned', models.IntegerField(default=0)),
+                ('n_started', models.IntegerField(default=0)),
+                ('n_finished', models.IntegerField(default=0)),
+                ('n_canceled', models.IntegerField(default=0)),
+                ('experiment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_counters', to='okra_server.experiment')),
+                ('participant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_counters', to='okra_server.participant')),
+            ],
+            options={
+                'unique_together': {('experiment', 'participant', 'practice')},
+            },
+        ),
+        migrations.RunPython(count_existing_assignments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.7 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0020_progresscounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taskassignment',
+            index=models.Index(fields=['finished_time', 'id'], name='okra_server_finishe_4657a4_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.7 on 2026-10-18 11:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0021_auto_20261018_1035'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='participant',
+            name='incomplete_experiments',
+        ),
+    ]
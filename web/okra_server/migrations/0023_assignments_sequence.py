@@ -0,0 +1,29 @@
+# Generated by Django 3.1.7 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('okra_server', '0022_remove_participant_incomplete_experiments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentsSequence',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='participant',
+            name='assignments_updated_time',
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='assignments_sequence',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -1,24 +1,65 @@
+import hashlib
+import json
+import operator
 import random
 import string
 import uuid
-from functools import partial
-from typing import Optional
+from functools import partial, reduce
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
-from okra_server.exceptions import NoTasksAvailable
+from okra_server.credentials import credential_cache
+from okra_server.exceptions import CyclicRequirements, NoTasksAvailable
+from okra_server.progress import aggregate_progress, progress_state
+from okra_server.results import (
+    compress_results,
+    decompress_results,
+    use_compressed_storage,
+)
+
+_system_random = random.SystemRandom()
 
 
 def _random_key(length: int):
     chars = string.ascii_letters + string.digits
-    key = "".join(random.choice(chars) for _ in range(length))
+    key = "".join(_system_random.choices(chars, k=length))
     return key
 
 
 new_registration_key = partial(_random_key, 24)
 
 
+class AssignmentsSequence(models.Model):
+    """Single-row counter that orders changes of assignments by commit.
+
+    Advancing it locks the row until the transaction ends, so a transaction that
+    takes a higher number always commits after the ones with lower numbers, and
+    progress updates (see `views.progress_updates`) can use the numbers as a cursor
+    without skipping changes that were committed late.
+    """
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def current(cls) -> int:
+        return cls.objects.filter(id=1).values_list("value", flat=True).first() or 0
+
+    @classmethod
+    def next(cls) -> int:
+        with transaction.atomic():
+            if not cls.objects.filter(id=1).update(value=models.F("value") + 1):
+                cls.objects.get_or_create(id=1)
+                cls.objects.filter(id=1).update(value=models.F("value") + 1)
+            return cls.current()
+
+
 class Participant(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     label = models.CharField(max_length=50, default="unlabeled", blank=True)
@@ -26,6 +67,10 @@ class Participant(models.Model):
     registration_key = models.CharField(
         max_length=24, null=True, default=new_registration_key
     )
+    # Incremented and sequenced (see `AssignmentsSequence`) whenever one of the
+    # participant's assignments changes state
+    assignments_version = models.PositiveIntegerField(default=0)
+    assignments_sequence = models.BigIntegerField(default=0, db_index=True)
 
     class Meta:
         ordering = ["label"]
@@ -38,18 +83,218 @@ class Participant(models.Model):
 
     @property
     def experiments(self) -> models.QuerySet["Experiment"]:
+        # The counts are read from the participant's progress counters (joined by
+        # the filter), so `n_tasks` and `n_tasks_done` match `get_n_tasks`
         experiments = Experiment.objects.filter(
-            tasks__assignments__participant=self,
-        ).distinct()
+            progress_counters__participant=self,
+            progress_counters__practice=False,
+            progress_counters__n_assigned__gt=0,
+        ).annotate(
+            n_tasks=models.F("progress_counters__n_assigned"),
+            n_tasks_done=models.F("progress_counters__n_started"),
+        )
         return experiments
 
+    @classmethod
+    def create_batch(cls, n: int, label_prefix: str = "") -> List["Participant"]:
+        """Create `n` participants labeled with the prefix and a running number,
+        continuing after the highest number already used with the prefix."""
+        start = max(
+            (
+                int(label[len(label_prefix) :])
+                for label in cls.objects.filter(
+                    label__startswith=label_prefix
+                ).values_list("label", flat=True)
+                if label[len(label_prefix) :].isdigit()
+            ),
+            default=0,
+        )
+        width = len(str(start + n))
+        return cls.objects.bulk_create(
+            cls(label=f"{label_prefix}{i:0{width}}")
+            for i in range(start + 1, start + n + 1)
+        )
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            TaskAssignment.delete_all(self.assignments.all())
+            return super().delete(*args, **kwargs)
+
+    def get_experiments_etag(self, experiment_id: Optional[str] = None) -> str:
+        """Return an ETag for the API representation of the participant's
+        experiments, derived from version counters instead of the content."""
+        assignments_version = Participant.objects.values_list(
+            "assignments_version", flat=True
+        ).get(id=self.id)
+        experiment_versions = Experiment.objects.filter(
+            tasks__assignments__participant=self,
+        )
+        if experiment_id is not None:
+            experiment_versions = experiment_versions.filter(id=experiment_id)
+        experiment_versions = (
+            experiment_versions.values_list("id", "version").distinct().order_by("id")
+        )
+        version_key = f"{assignments_version}:" + ",".join(
+            f"{experiment_id}:{version}"
+            for experiment_id, version in experiment_versions
+        )
+        return hashlib.sha1(version_key.encode()).hexdigest()
+
+    def get_experiment_bundle_etag(
+        self, experiment_id: str, data_reference: bool = False
+    ) -> str:
+        """Return an ETag for the offline bundle of an experiment, which also
+        depends on the data of its practice task and unstarted tasks (task data can
+        change without a new experiment version) and on how the data is included."""
+        data_hashes = [
+            shared_data_id or TaskData.hash_data(data)
+            for shared_data_id, data in Task.objects.filter(
+                models.Q(practice_experiment=experiment_id)
+                | models.Q(
+                    experiment=experiment_id,
+                    assignments__participant=self,
+                    assignments__started_time__isnull=True,
+                )
+            )
+            .order_by("id")
+            .values_list("shared_data_id", "data")
+        ]
+        bundle_key = (
+            f"{self.get_experiments_etag(experiment_id)}:{int(data_reference)}:"
+            + ",".join(data_hashes)
+        )
+        return hashlib.sha1(bundle_key.encode()).hexdigest()
+
+    @classmethod
+    def touch_assignments(cls, participant_ids: Iterable[uuid.UUID]):
+        with transaction.atomic():
+            sequence = AssignmentsSequence.next()
+            cls.objects.filter(id__in=participant_ids).update(
+                assignments_version=models.F("assignments_version") + 1,
+                assignments_sequence=sequence,
+            )
+
+    def get_available_experiments(self) -> List["Experiment"]:
+        """Return the available experiments in a constant number of queries.
+
+        Equivalent to filtering `experiments` by `Experiment.is_available`, but
+        requirements are checked against the counts annotated on the participant's
+        own experiments instead of querying the counters per required experiment.
+        """
+        experiments = list(
+            self.experiments.prefetch_related(
+                "ratings",
+                models.Prefetch(
+                    "required_experiments",
+                    queryset=Experiment.objects.only("id"),
+                ),
+            )
+        )
+        # Experiments without assignments for this participant are never unfinished
+        unfinished_ids = {
+            experiment.id
+            for experiment in experiments
+            if experiment.n_tasks_done < experiment.n_tasks
+        }
+        return [
+            experiment
+            for experiment in experiments
+            if experiment.visible
+            and not any(
+                required_experiment.id in unfinished_ids
+                for required_experiment in experiment.required_experiments.all()
+            )
+        ]
+
     def unregister(self, registration_key: Optional[str] = None):
         self.device_key = None
         self.registration_key = registration_key or new_registration_key()
+        credential_cache.invalidate(str(self.id))
 
     def register(self):
         self.device_key = _random_key(24)
         self.registration_key = None
+        credential_cache.invalidate(str(self.id))
+
+    def finish_tasks(
+        self, results: Dict[uuid.UUID, Optional[dict]]
+    ) -> List["TaskAssignment"]:
+        """Finish the unfinished assignments of multiple tasks at once.
+
+        `results` maps task IDs to results. Returns the finished assignments; tasks
+        without an unfinished assignment are skipped, except for practice tasks of
+        the participant's experiments (as in offline bundles), which are assigned.
+        """
+        with transaction.atomic():
+            assignments = {}
+            for assignment in self.assignments.select_for_update().filter(
+                task_id__in=results,
+                finished_time__isnull=True,
+            ):
+                assignments.setdefault(assignment.task_id, assignment)
+            finished_time = timezone.now()
+            # At most one practice task per experiment, so they are created one
+            # at a time
+            for task_id in Task.objects.filter(
+                id__in=results.keys() - assignments.keys(),
+                practice_experiment__in=self.experiments.values("id"),
+            ).values_list("id", flat=True):
+                assignments[task_id] = TaskAssignment.objects.create(
+                    participant=self, task_id=task_id
+                )
+            progress_changes = []
+            for task_id, assignment in assignments.items():
+                before = assignment.get_progress_state()
+                # Tasks from an offline bundle are reported only once finished
+                if assignment.started_time is None:
+                    assignment.started_time = finished_time
+                assignment.set_results(results[task_id])
+                assignment.finished_time = finished_time
+                progress_changes.append(
+                    (assignment, before, assignment.get_progress_state())
+                )
+            TaskAssignment.objects.bulk_update(
+                assignments.values(), ["results", "started_time", "finished_time"]
+            )
+            TaskAssignmentResults.store(assignments.values())
+            ProgressCounter.record(progress_changes)
+            if assignments:
+                Participant.touch_assignments([self.id])
+        return list(assignments.values())
+
+
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def _invalidate_cached_credentials(sender, instance: Participant, **kwargs):
+    # Also covers changes that bypass `register` and `unregister` (e.g. admin site)
+    credential_cache.invalidate(str(instance.id))
+
+
+def _requirement_levels(requirements: Dict[uuid.UUID, set]) -> Dict[uuid.UUID, int]:
+    """Compute the requirement level of every experiment in a requirement graph,
+    given as a mapping from experiment IDs to the IDs of their requirements."""
+    levels = {}
+    visiting = set()
+
+    def visit(experiment_id):
+        if experiment_id in levels:
+            return levels[experiment_id]
+        if experiment_id in visiting:
+            raise CyclicRequirements()
+        visiting.add(experiment_id)
+        levels[experiment_id] = max(
+            (
+                visit(required_id) + 1
+                for required_id in requirements.get(experiment_id, ())
+            ),
+            default=0,
+        )
+        visiting.remove(experiment_id)
+        return levels[experiment_id]
+
+    for experiment_id in requirements:
+        visit(experiment_id)
+    return levels
 
 
 class TaskType(models.TextChoices):
@@ -86,6 +331,11 @@ class Experiment(models.Model):
         symmetrical=False,
     )
     visible = models.BooleanField(default=False)
+    # Position in the requirement graph (0 without requirements, otherwise one more
+    # than the highest level of the required experiments)
+    requirement_level = models.PositiveIntegerField(default=0)
+    # Incremented on every save (content, requirements, ratings or assignments)
+    version = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ["title", "id"]
@@ -93,6 +343,54 @@ class Experiment(models.Model):
     def __str__(self):
         return f'Experiment "{self.title}" ({self.task_type})'
 
+    def save(self, *args, **kwargs):
+        self.version += 1
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # Tasks are deleted in bulk, so their shared data is cleaned up here
+        data_hashes = list(
+            self.tasks.exclude(shared_data=None).values_list(
+                "shared_data_id", flat=True
+            )
+        )
+        with transaction.atomic():
+            TaskAssignment.delete_all(
+                TaskAssignment.objects.filter(task__experiment=self)
+            )
+            result = super().delete(*args, **kwargs)
+        TaskData.delete_unreferenced(data_hashes)
+        return result
+
+    def set_required_experiments(self, required_experiment_ids: Iterable):
+        """Replace the required experiments and update the requirement levels.
+
+        Raises `CyclicRequirements` if the experiment would (indirectly) require
+        itself.
+        """
+        required_experiment_ids = {
+            uuid.UUID(str(experiment_id)) for experiment_id in required_experiment_ids
+        }
+        Requirement = Experiment.required_experiments.through
+        requirements = {}
+        for from_id, to_id in Requirement.objects.exclude(
+            from_experiment=self
+        ).values_list("from_experiment_id", "to_experiment_id"):
+            requirements.setdefault(from_id, set()).add(to_id)
+        requirements[self.id] = required_experiment_ids
+        levels = _requirement_levels(requirements)
+
+        with transaction.atomic():
+            self.required_experiments.set(required_experiment_ids)
+            changed_experiments = []
+            for experiment in Experiment.objects.only("requirement_level"):
+                level = levels.get(experiment.id, 0)
+                if experiment.requirement_level != level:
+                    experiment.requirement_level = level
+                    changed_experiments.append(experiment)
+            Experiment.objects.bulk_update(changed_experiments, ["requirement_level"])
+        self.requirement_level = levels[self.id]
+
     def get_assignments(
         self, participant: Participant, practice: bool = False
     ) -> models.QuerySet["TaskAssignment"]:
@@ -108,6 +406,47 @@ class Experiment(models.Model):
             )
         return assignments
 
+    def get_progress(self) -> models.QuerySet[Participant]:
+        """Return the participants with assignments in this experiment, annotated
+        with the task counts shown on the progress page (in a single query)."""
+        return (
+            Participant.objects.annotate(
+                tasks_counter=models.FilteredRelation(
+                    "progress_counters",
+                    condition=models.Q(
+                        progress_counters__experiment=self,
+                        progress_counters__practice=False,
+                    ),
+                ),
+                practice_counter=models.FilteredRelation(
+                    "progress_counters",
+                    condition=models.Q(
+                        progress_counters__experiment=self,
+                        progress_counters__practice=True,
+                    ),
+                ),
+            )
+            .filter(tasks_counter__n_assigned__gt=0)
+            .annotate(
+                n_tasks=models.F("tasks_counter__n_assigned"),
+                n_tasks_unfinished=(
+                    models.F("tasks_counter__n_started")
+                    - models.F("tasks_counter__n_finished")
+                ),
+                n_tasks_finished=(
+                    models.F("tasks_counter__n_finished")
+                    - models.F("tasks_counter__n_canceled")
+                ),
+                n_tasks_canceled=models.F("tasks_counter__n_canceled"),
+                n_practice_tasks_finished=Coalesce(
+                    models.F("practice_counter__n_finished")
+                    - models.F("practice_counter__n_canceled"),
+                    0,
+                ),
+            )
+            .order_by("label", "id")
+        )
+
     def get_n_tasks(
         self,
         participant: Participant,
@@ -116,52 +455,147 @@ class Experiment(models.Model):
         finished: Optional[bool] = None,
         canceled: Optional[bool] = None,
     ) -> int:
-        assignments = self.get_assignments(participant, practice=practice)
-
-        if started is not None:
-            assignments = assignments.filter(started_time__isnull=False)
-        if finished is not None:
-            assignments = assignments.filter(finished_time__isnull=not finished)
-        if canceled is not None:
-            assignments = assignments.filter(canceled=canceled)
-
-        return assignments.count()
+        counter = self.progress_counters.filter(
+            participant=participant, practice=practice
+        ).first()
+        if counter is None:
+            return 0
+        return counter.count(started=started, finished=finished, canceled=canceled)
 
     def is_available(self, participant: Participant) -> bool:
         if not self.visible:
             return False
-        for experiment in self.required_experiments.all():
-            if experiment.get_n_tasks(
-                participant, started=True
-            ) < experiment.get_n_tasks(participant):
-                return False
-        return True
+        # Read from the progress counters, like `get_available_experiments`
+        return not self.required_experiments.filter(
+            progress_counters__participant=participant,
+            progress_counters__practice=False,
+            progress_counters__n_started__lt=models.F("progress_counters__n_assigned"),
+        ).exists()
 
     def start_task(self, participant: Participant, practice: bool = False) -> "Task":
-        # Cancel previously started and unfinished assignments
-        canceled_assignments = TaskAssignment.objects.filter(
-            participant=participant,
-            started_time__isnull=False,
-            finished_time__isnull=True,
-        )
-        for assignment in canceled_assignments:
-            assignment.cancel()
-        if practice:
-            assignment = TaskAssignment.objects.create(
+        with transaction.atomic():
+            # Serialize starts of the same participant, so that concurrent starts
+            # cannot both cancel before either claims and leave two assignments
+            # started. SQLite serializes them by the write lock of the update below
+            # (reading first would make concurrent upgrades to it fail)
+            if connection.features.has_select_for_update:
+                Participant.objects.select_for_update().filter(
+                    id=participant.id
+                ).first()
+            started_time = timezone.now()
+            # Cancel previously started and unfinished assignments
+            TaskAssignment.objects.filter(
                 participant=participant,
-                task=self.practice_task,
-            )
-        else:
-            assignment = TaskAssignment.objects.filter(
-                task__experiment=self,
-                participant=participant,
-                started_time__isnull=True,
-            ).first()
+                started_time__isnull=False,
+                finished_time__isnull=True,
+            ).update(finished_time=started_time, canceled=True)
+            # Updating first keeps the write lock on SQLite; the canceled rows are
+            # identified by their finished time afterwards
+            progress_changes = [
+                (
+                    assignment,
+                    {
+                        **assignment.get_progress_state(),
+                        "n_finished": 0,
+                        "n_canceled": 0,
+                    },
+                    assignment.get_progress_state(),
+                )
+                for assignment in TaskAssignment.objects.filter(
+                    participant=participant,
+                    finished_time=started_time,
+                    canceled=True,
+                ).defer("results")
+            ]
+            if practice:
+                assignment = TaskAssignment.objects.create(
+                    participant=participant,
+                    task=self.practice_task,
+                    started_time=started_time,
+                )
+            else:
+                assignment = self._claim_assignment(participant, started_time)
+                if assignment is not None:
+                    progress_changes.append(
+                        (
+                            assignment,
+                            {**assignment.get_progress_state(), "n_started": 0},
+                            assignment.get_progress_state(),
+                        )
+                    )
+            ProgressCounter.record(progress_changes)
+            Participant.touch_assignments([participant.id])
         if assignment is None:
             raise NoTasksAvailable()
-        assignment.start()
         return assignment.task
 
+    def _claim_assignment(
+        self, participant: Participant, started_time
+    ) -> Optional["TaskAssignment"]:
+        """Mark the next unstarted assignment as started and return it.
+
+        Concurrent calls never claim the same assignment: rows being claimed are
+        locked and skipped where supported (PostgreSQL), otherwise the claim is a
+        conditional update that is retried if another call won the race. Calls for
+        the same participant are serialized by `start_task` in addition.
+        """
+        assignments = TaskAssignment.objects.filter(
+            task__experiment=self,
+            participant=participant,
+            started_time__isnull=True,
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            assignment = (
+                assignments.select_for_update(skip_locked=True, of=("self",))
+                .order_by("id")
+                .first()
+            )
+            if assignment is not None:
+                assignment.started_time = started_time
+                assignment.save(update_fields=["started_time"])
+            return assignment
+
+        while True:
+            assignment = assignments.order_by("id").first()
+            if assignment is None:
+                return None
+            if assignments.filter(id=assignment.id).update(started_time=started_time):
+                assignment.started_time = started_time
+                return assignment
+
+
+class TaskData(models.Model):
+    """Task data shared by all tasks with the same content."""
+
+    hash = models.CharField(max_length=64, primary_key=True)
+    data = models.JSONField()
+
+    def __str__(self):
+        return f'Task data "{self.hash}"'
+
+    @staticmethod
+    def hash_data(data) -> str:
+        """Return the SHA-256 hash of the normalized JSON representation."""
+        normalized = json.dumps(
+            data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    @classmethod
+    def get_or_create_for(cls, data) -> "TaskData":
+        task_data, _ = cls.objects.get_or_create(
+            hash=cls.hash_data(data), defaults={"data": data}
+        )
+        return task_data
+
+    @classmethod
+    def delete_unreferenced(cls, hashes: Optional[Iterable[str]] = None):
+        """Delete the given shared data (default: all) if no task refers to it."""
+        unreferenced = cls.objects.filter(tasks__isnull=True)
+        if hashes is not None:
+            unreferenced = unreferenced.filter(hash__in=hashes)
+        unreferenced.delete()
+
 
 class Task(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
@@ -173,12 +607,82 @@ class Task(models.Model):
         related_name="tasks",
     )
     data = models.JSONField(null=True)
+    # Used instead of `data` if `TASK_DATA_STORAGE` is "deduplicated"
+    shared_data = models.ForeignKey(
+        TaskData,
+        null=True,
+        on_delete=models.PROTECT,
+        related_name="tasks",
+    )
 
     def __str__(self):
         if self.experiment is None:
             return f'Practice task "{self.id}" of {self.practice_experiment}'
         return f'Task "{self.id}" of {self.experiment}'
 
+    def get_data(self):
+        """Return the data, wherever it is stored.
+
+        Use `select_related("shared_data")` when loading data of many tasks.
+        """
+        if self.shared_data_id is not None:
+            return self.shared_data.data
+        return self.data
+
+    def get_data_hash(self) -> str:
+        if self.shared_data_id is not None:
+            return self.shared_data_id
+        return TaskData.hash_data(self.data)
+
+    def set_data(self, data):
+        """Set the data according to `TASK_DATA_STORAGE`. Shared data that is no
+        longer referenced is deleted once the task is saved."""
+        previous_hash = self.shared_data_id
+        if settings.TASK_DATA_STORAGE == "deduplicated" and data is not None:
+            self.shared_data = TaskData.get_or_create_for(data)
+            self.data = None
+        else:
+            self.shared_data = None
+            self.data = data
+        if previous_hash is not None and previous_hash != self.shared_data_id:
+            self._replaced_shared_data_hash = previous_hash
+
+    @staticmethod
+    def set_data_many(tasks: List["Task"], data: list) -> set:
+        """Like `set_data` for many tasks, fetching and creating shared data in two
+        queries. Returns the hashes of shared data that is no longer referenced by
+        these tasks, to pass to `TaskData.delete_unreferenced` once they are saved
+        (e.g. with `bulk_update`, which does not send signals)."""
+        deduplicated = settings.TASK_DATA_STORAGE == "deduplicated"
+        hashes = [
+            TaskData.hash_data(item) if deduplicated and item is not None else None
+            for item in data
+        ]
+        shared_data = TaskData.objects.in_bulk(set(hashes) - {None})
+        new_shared_data = {
+            data_hash: TaskData(hash=data_hash, data=item)
+            for data_hash, item in zip(hashes, data)
+            if data_hash is not None and data_hash not in shared_data
+        }
+        TaskData.objects.bulk_create(new_shared_data.values(), ignore_conflicts=True)
+        shared_data.update(new_shared_data)
+        replaced_hashes = set()
+        for task, item, data_hash in zip(tasks, data, hashes):
+            previous_hash = task.shared_data_id
+            task.shared_data = shared_data.get(data_hash)
+            task.data = item if data_hash is None else None
+            if previous_hash is not None and previous_hash != task.shared_data_id:
+                replaced_hashes.add(previous_hash)
+        return replaced_hashes
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            TaskAssignment.delete_all(self.assignments.all())
+            result = super().delete(*args, **kwargs)
+        if self.shared_data_id is not None:
+            TaskData.delete_unreferenced([self.shared_data_id])
+        return result
+
     @property
     def is_practice(self) -> bool:
         try:
@@ -219,25 +723,350 @@ class TaskAssignment(models.Model):
 
     class Meta:
         ordering = ["id"]
+        # For incremental results exports (see `export.get_finished_since`)
+        indexes = [models.Index(fields=["finished_time", "id"])]
 
     def start(self):
+        before = self.get_progress_state()
         self.started_time = timezone.now()
-        self.save()
+        with transaction.atomic():
+            self.save()
+            ProgressCounter.record([(self, before, self.get_progress_state())])
+        Participant.touch_assignments([self.participant_id])
 
     def finish(self, results: dict):
-        self.results = results
+        before = self.get_progress_state()
+        self.set_results(results)
         self.finished_time = timezone.now()
-        self.save()
+        # Like in `Participant.finish_tasks`, finishing implies starting
+        if self.started_time is None:
+            self.started_time = self.finished_time
+        with transaction.atomic():
+            self.save()
+            TaskAssignmentResults.store([self])
+            ProgressCounter.record([(self, before, self.get_progress_state())])
+        Participant.touch_assignments([self.participant_id])
+
+    def get_results(self) -> Optional[dict]:
+        """Return the results, wherever they are stored.
+
+        Use `select_related("compressed_results")` when loading results of many
+        assignments, and `defer("results")` when results are not needed at all.
+        """
+        if self.results is not None:
+            return self.results
+        try:
+            compressed_results = self.compressed_results
+        except TaskAssignmentResults.DoesNotExist:
+            return None
+        return decompress_results(compressed_results.codec, compressed_results.data)
+
+    def set_results(self, results: Optional[dict]):
+        """Set the results according to `RESULTS_STORAGE`. Compressed results are
+        written by `TaskAssignmentResults.store` once the assignment is saved."""
+        if use_compressed_storage() and results is not None:
+            self.results = None
+            self._unsaved_results = results
+        else:
+            self.results = results
+            self._unsaved_results = None
 
     def cancel(self):
+        before = self.get_progress_state()
         self.finished_time = timezone.now()
         self.canceled = True
-        self.save()
+        # Canceled assignments count as started (see `progress_state`)
+        if self.started_time is None:
+            self.started_time = self.finished_time
+        with transaction.atomic():
+            self.save()
+            ProgressCounter.record([(self, before, self.get_progress_state())])
+        Participant.touch_assignments([self.participant_id])
+
+    def get_progress_state(self) -> Dict[str, int]:
+        """Return the contribution of this assignment to its `ProgressCounter`."""
+        return progress_state(self.started_time, self.finished_time, self.canceled)
+
+    @staticmethod
+    def delete_all(assignments: models.QuerySet):
+        """Delete assignments with their compressed results, without updating
+        progress counters.
+
+        Their compressed results are deleted by cascade, which fetches the
+        assignments first, so only their IDs are loaded (through a plain queryset,
+        as related managers also load the related object's ID).
+        """
+        TaskAssignment.objects.filter(id__in=assignments.values("id")).only(
+            "id"
+        ).delete()
 
     def __str__(self):
         return f"Assignment of {self.task} to {self.participant}"
 
 
+class ProgressCounter(models.Model):
+    """Numbers of a participant's assignments in an experiment by state, maintained
+    by the assignment lifecycle methods instead of counting assignments.
+
+    Canceled assignments count as finished, and finished ones as started. Deleted
+    assignments are subtracted with `record_deleted`. Use the `rebuildprogress`
+    command to repair counters after changing assignments in other ways (e.g.
+    through the admin site).
+    """
+
+    id = models.AutoField(primary_key=True)
+    experiment = models.ForeignKey(
+        Experiment,
+        on_delete=models.CASCADE,
+        related_name="progress_counters",
+    )
+    participant = models.ForeignKey(
+        Participant,
+        on_delete=models.CASCADE,
+        related_name="progress_counters",
+    )
+    practice = models.BooleanField()
+    n_assigned = models.IntegerField(default=0)
+    n_started = models.IntegerField(default=0)
+    n_finished = models.IntegerField(default=0)
+    n_canceled = models.IntegerField(default=0)
+
+    # Counters updated by one statement in `record`
+    UPDATE_BATCH_SIZE = 100
+
+    class Meta:
+        unique_together = [["experiment", "participant", "practice"]]
+
+    def __str__(self):
+        return f"Progress of {self.participant} in {self.experiment}"
+
+    def count(
+        self,
+        started: Optional[bool] = None,
+        finished: Optional[bool] = None,
+        canceled: Optional[bool] = None,
+    ) -> int:
+        """Count assignments like `Experiment.get_n_tasks`."""
+        # Assignments by state (canceled ones count as finished, and finished ones
+        # as started)
+        states = {
+            "unstarted": self.n_assigned - self.n_started,
+            "started": self.n_started - self.n_finished,
+            "finished": self.n_finished - self.n_canceled,
+            "canceled": self.n_canceled,
+        }
+        if started is not None:
+            states.pop("unstarted")
+        if finished is not None:
+            for state in ["unstarted", "started"] if finished else ["finished"]:
+                states.pop(state, None)
+            if not finished:
+                states.pop("canceled")
+        if canceled is not None:
+            states = {
+                state: n
+                for state, n in states.items()
+                if (state == "canceled") == canceled
+            }
+        return sum(states.values())
+
+    @classmethod
+    def record(
+        cls,
+        changes: Iterable[
+            Tuple[TaskAssignment, Optional[Dict[str, int]], Optional[Dict[str, int]]]
+        ],
+    ):
+        """Apply changes of assignments, given as the assignment and its progress
+        states before and after (None if it did not or no longer exists)."""
+        deltas = {}
+        for assignment, before, after in changes:
+            key = (assignment.task_id, assignment.participant_id)
+            delta = deltas.setdefault(key, dict.fromkeys(progress_state(), 0))
+            for field in delta:
+                delta[field] += (after or {}).get(field, 0) - (before or {}).get(
+                    field, 0
+                )
+        if not deltas:
+            return
+        task_experiments = {
+            task_id: (
+                (experiment_id, False)
+                if experiment_id is not None
+                else (practice_experiment_id, True)
+            )
+            for task_id, experiment_id, practice_experiment_id in Task.objects.filter(
+                id__in={task_id for task_id, _ in deltas}
+            ).values_list("id", "experiment_id", "practice_experiment")
+        }
+        counter_deltas = {}
+        for (task_id, participant_id), delta in deltas.items():
+            experiment_id, practice = task_experiments.get(task_id, (None, None))
+            if experiment_id is None:
+                continue
+            counter_delta = counter_deltas.setdefault(
+                (experiment_id, participant_id, practice),
+                dict.fromkeys(delta, 0),
+            )
+            for field, value in delta.items():
+                counter_delta[field] += value
+        cls._apply(counter_deltas)
+
+    @classmethod
+    def record_deleted(cls, assignments: models.QuerySet):
+        """Subtract assignments that are about to be deleted.
+
+        Deleting assignments (directly or through their tasks) does not update the
+        counters, so that deletes stay in bulk. Counters of deleted experiments and
+        participants are deleted with them.
+        """
+        cls._apply(
+            {
+                (
+                    row.pop("experiment_id"),
+                    row.pop("participant_id"),
+                    row.pop("practice"),
+                ): {field: -value for field, value in row.items()}
+                for row in aggregate_progress(assignments)
+            }
+        )
+
+    @classmethod
+    def _apply(cls, counter_deltas: Dict[Tuple[uuid.UUID, uuid.UUID, bool], dict]):
+        counter_deltas = {
+            key: delta for key, delta in counter_deltas.items() if any(delta.values())
+        }
+        keys = list(counter_deltas)
+        missing_keys = []
+        for start in range(0, len(keys), cls.UPDATE_BATCH_SIZE):
+            batch = keys[start : start + cls.UPDATE_BATCH_SIZE]
+            conditions = {
+                key: models.Q(
+                    experiment_id=key[0], participant_id=key[1], practice=key[2]
+                )
+                for key in batch
+            }
+            counters = cls.objects.filter(reduce(operator.or_, conditions.values()))
+            updates = {
+                field: models.Case(
+                    *(
+                        models.When(
+                            conditions[key],
+                            then=models.F(field) + counter_deltas[key][field],
+                        )
+                        for key in batch
+                        if counter_deltas[key][field]
+                    ),
+                    default=models.F(field),
+                )
+                for field in progress_state()
+            }
+            if counters.update(**updates) < len(batch):
+                existing_keys = set(
+                    counters.values_list("experiment_id", "participant_id", "practice")
+                )
+                missing_keys += [key for key in batch if key not in existing_keys]
+        # Counters are only created for new assignments, not when assignments
+        # of a deleted experiment or participant are removed
+        missing_keys = [
+            key
+            for key in missing_keys
+            if any(value > 0 for value in counter_deltas[key].values())
+        ]
+        if not missing_keys:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(
+                    cls(
+                        experiment_id=experiment_id,
+                        participant_id=participant_id,
+                        practice=practice,
+                        **counter_deltas[experiment_id, participant_id, practice],
+                    )
+                    for experiment_id, participant_id, practice in missing_keys
+                )
+        except IntegrityError:
+            # Created concurrently since the update
+            cls._apply({key: counter_deltas[key] for key in missing_keys})
+
+    @classmethod
+    def rebuild(cls, experiment_ids: Optional[Iterable[uuid.UUID]] = None) -> int:
+        """Recount the counters of the given experiments (default: all) from their
+        assignments. Returns the number of counters."""
+        with transaction.atomic():
+            counters = cls.objects.all()
+            assignments = TaskAssignment.objects.all()
+            if experiment_ids is not None:
+                experiment_ids = list(experiment_ids)
+                counters = counters.filter(experiment_id__in=experiment_ids)
+                assignments = assignments.filter(
+                    models.Q(task__experiment_id__in=experiment_ids)
+                    | models.Q(task__practice_experiment__in=experiment_ids)
+                )
+            counters.delete()
+            rows = aggregate_progress(assignments)
+            cls.objects.bulk_create(cls(**row) for row in rows)
+        return len(rows)
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of an API request made with an `Idempotency-Key` header."""
+
+    id = models.AutoField(primary_key=True)
+    participant = models.ForeignKey(
+        Participant,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    key = models.CharField(max_length=255)
+    path = models.CharField(max_length=255)
+    status = models.PositiveSmallIntegerField()
+    response = models.BinaryField()
+    created_time = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        unique_together = [["participant", "key"]]
+
+    def __str__(self):
+        return f'Idempotency key "{self.key}" of {self.participant}'
+
+
+class TaskAssignmentResults(models.Model):
+    """Compressed results of an assignment, kept out of the assignments table."""
+
+    assignment = models.OneToOneField(
+        TaskAssignment,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="compressed_results",
+    )
+    codec = models.CharField(max_length=10)
+    data = models.BinaryField()
+
+    def __str__(self):
+        return f"Results of {self.assignment}"
+
+    @classmethod
+    def store(cls, assignments: Iterable[TaskAssignment]):
+        """Write the compressed results set with `TaskAssignment.set_results`."""
+        if not use_compressed_storage():
+            return
+        assignments = list(assignments)
+        cls.objects.filter(assignment__in=assignments).delete()
+        stored = []
+        for assignment in assignments:
+            results = getattr(assignment, "_unsaved_results", None)
+            if results is not None:
+                codec, data = compress_results(results)
+                assignment.compressed_results = cls(
+                    assignment=assignment, codec=codec, data=data
+                )
+                stored.append(assignment.compressed_results)
+                assignment._unsaved_results = None
+        cls.objects.bulk_create(stored)
+
+
 class TaskRatingType(models.TextChoices):
     EMOTICON = "emoticon", "Emoticons (right-positive)"
     EMOTICON_REVERSED = "emoticon-reversed", "Emoticons (left-positive)"
@@ -260,3 +1089,19 @@ class TaskRating(models.Model):
     )
     low_extreme = models.TextField(null=True)
     high_extreme = models.TextField(null=True)
+
+
+@receiver(post_save, sender=Task)
+def _delete_replaced_task_data(sender, instance: Task, **kwargs):
+    replaced_hash = getattr(instance, "_replaced_shared_data_hash", None)
+    if replaced_hash is not None:
+        instance._replaced_shared_data_hash = None
+        TaskData.delete_unreferenced([replaced_hash])
+
+
+@receiver(post_save, sender=TaskAssignment)
+def _count_created_assignment(
+    sender, instance: TaskAssignment, created: bool, raw: bool = False, **kwargs
+):
+    if created and not raw:
+        ProgressCounter.record([(instance, None, instance.get_progress_state())])
@@ -0,0 +1,56 @@
+from typing import Dict, List
+
+from django.db import models
+
+
+def progress_state(
+    started_time=None, finished_time=None, canceled: bool = False
+) -> Dict[str, int]:
+    """Return the contribution of an assignment to its progress counter (canceled
+    assignments count as finished, and finished ones as started)."""
+    finished = finished_time is not None or canceled
+    started = started_time is not None or finished
+    return {
+        "n_assigned": 1,
+        "n_started": int(started),
+        "n_finished": int(finished),
+        "n_canceled": int(canceled),
+    }
+
+
+def aggregate_progress(assignments: models.QuerySet) -> List[dict]:
+    """Count the given assignments by experiment and participant, like
+    `ProgressCounter`. Returns the counter fields of each row.
+
+    Only uses fields of the assignments queryset, so that migrations can pass
+    historical models.
+    """
+    canceled = models.Q(canceled=True)
+    finished = models.Q(finished_time__isnull=False) | canceled
+    started = models.Q(started_time__isnull=False) | finished
+    counts = {
+        "n_assigned": models.Count("id"),
+        "n_started": models.Count("id", filter=started),
+        "n_finished": models.Count("id", filter=finished),
+        "n_canceled": models.Count("id", filter=canceled),
+    }
+    rows = []
+    for experiment_field, practice in [
+        ("task__experiment", False),
+        ("task__practice_experiment", True),
+    ]:
+        for row in (
+            assignments.filter(**{f"{experiment_field}__isnull": False})
+            .values(experiment_field, "participant")
+            .annotate(**counts)
+            .order_by()
+        ):
+            rows.append(
+                {
+                    "experiment_id": row.pop(experiment_field),
+                    "participant_id": row.pop("participant"),
+                    "practice": practice,
+                    **row,
+                }
+            )
+    return rows
@@ -0,0 +1,122 @@
+import base64
+import hashlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List
+
+import qrcode
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from qrcode.image.svg import SvgPathImage
+
+QR_CODE_CONTENT_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def get_registration_data(base_url: str, participant) -> str:
+    """Return the data encoded in a participant's registration QR code."""
+    return f"{base_url}\n" f"{participant.id}\n" f"{participant.registration_key}"
+
+
+def get_qr_code_version(data: str) -> str:
+    """Return a short hash identifying the QR code for the given data."""
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def render_qr_code(data: str, image_format: str) -> bytes:
+    if image_format == "svg":
+        # Rendered as a single path, without PIL
+        image = qrcode.make(data, image_factory=SvgPathImage)
+        image_bytes = io.BytesIO()
+        image.save(image_bytes)
+    else:
+        image = qrcode.make(data)
+        image_bytes = io.BytesIO()
+        image.save(image_bytes, "PNG")
+    return image_bytes.getvalue()
+
+
+def get_qr_code(data: str, image_format: str) -> bytes:
+    """Return a rendered QR code from the cache, rendering it if necessary.
+
+    Entries are keyed by the encoded data, so a new registration key or base URL
+    results in a new entry and outdated ones are never returned.
+    """
+    return get_qr_codes([data], image_format)[0]
+
+
+def _get_cache_key(data: str, image_format: str) -> str:
+    return f"qr_code:{image_format}:{get_qr_code_version(data)}"
+
+
+def get_qr_codes(
+    data: Iterable[str],
+    image_format: str,
+    parallel: bool = False,
+    min_parallel: int = 32,
+) -> List[bytes]:
+    """Like `get_qr_code`, for many QR codes at once. With `parallel`, if at least
+    `min_parallel` of them are not cached yet, they are rendered in parallel
+    processes (meant for commands; web requests should not start processes)."""
+    data = list(data)
+    cache_keys = [_get_cache_key(item, image_format) for item in data]
+    images = cache.get_many(cache_keys)
+    missing = [
+        (cache_key, item)
+        for cache_key, item in zip(cache_keys, data)
+        if cache_key not in images
+    ]
+    if missing:
+        missing_data = [item for _, item in missing]
+        if parallel and len(missing) >= min_parallel:
+            with ProcessPoolExecutor() as executor:
+                rendered = list(
+                    executor.map(
+                        render_qr_code,
+                        missing_data,
+                        [image_format] * len(missing_data),
+                        chunksize=8,
+                    )
+                )
+        else:
+            rendered = [render_qr_code(item, image_format) for item in missing_data]
+        new_images = {
+            cache_key: image for (cache_key, _), image in zip(missing, rendered)
+        }
+        cache.set_many(new_images, timeout=None)
+        images.update(new_images)
+    return [images[cache_key] for cache_key in cache_keys]
+
+
+def render_registration_sheet(
+    base_url: str,
+    participants: Iterable,
+    image_format: str = "svg",
+    parallel: bool = False,
+) -> str:
+    """Render a printable HTML page with the registration details and QR codes of
+    the given participants (see `get_qr_codes` for `parallel`)."""
+    participants = list(participants)
+    images = get_qr_codes(
+        [get_registration_data(base_url, participant) for participant in participants],
+        image_format,
+        parallel,
+    )
+    return render_to_string(
+        "okra_server/registration_sheet.html",
+        {
+            "base_url": base_url,
+            "registrations": [
+                {
+                    "participant": participant,
+                    "qr_src": (
+                        f"data:{QR_CODE_CONTENT_TYPES[image_format]};base64,"
+                        + base64.b64encode(image).decode("ascii")
+                    ),
+                }
+                for participant, image in zip(participants, images)
+            ],
+        },
+    )
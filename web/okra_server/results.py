@@ -0,0 +1,91 @@
+import gzip
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from okra_server.serialization import dumps, loads
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+def use_compressed_storage() -> bool:
+    return settings.RESULTS_STORAGE == "compressed"
+
+
+def compress_results(results: dict) -> Tuple[str, bytes]:
+    """Encode results as JSON and compress them with zstd (if the zstandard
+    package is installed) or gzip. Returns the codec name and the data."""
+    data = dumps(results)
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor().compress(data)
+    return "gzip", gzip.compress(data, compresslevel=6)
+
+
+def decompress_results(codec: str, data: bytes) -> Optional[dict]:
+    data = bytes(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read results")
+        return loads(zstandard.ZstdDecompressor().decompress(data))
+    if codec == "gzip":
+        return loads(gzip.decompress(data))
+    raise ValueError(f"Unknown results codec: {codec}")
+
+
+def move_results(
+    assignment_model, results_model, compressed: bool, batch_size: int = 100
+) -> int:
+    """Move existing results between the `results` column of `assignment_model`
+    and `results_model`, in transactions of `batch_size` assignments.
+
+    The models are passed explicitly so that migrations can use their historical
+    versions. Returns the number of moved results.
+    """
+    n_moved = 0
+    while True:
+        with transaction.atomic():
+            if compressed:
+                assignments = list(
+                    assignment_model.objects.filter(results__isnull=False)
+                    .only("id", "results")
+                    .order_by("id")[:batch_size]
+                )
+                if not assignments:
+                    return n_moved
+                stored = []
+                for assignment in assignments:
+                    codec, data = compress_results(assignment.results)
+                    stored.append(
+                        results_model(
+                            assignment_id=assignment.id, codec=codec, data=data
+                        )
+                    )
+                results_model.objects.filter(
+                    assignment_id__in=[assignment.id for assignment in assignments]
+                ).delete()
+                results_model.objects.bulk_create(stored)
+                assignment_model.objects.filter(
+                    id__in=[assignment.id for assignment in assignments]
+                ).update(results=None)
+            else:
+                stored = list(
+                    results_model.objects.order_by("assignment_id")[:batch_size]
+                )
+                if not stored:
+                    return n_moved
+                assignments = [
+                    assignment_model(
+                        id=item.assignment_id,
+                        results=decompress_results(item.codec, item.data),
+                    )
+                    for item in stored
+                ]
+                assignment_model.objects.bulk_update(assignments, ["results"])
+                results_model.objects.filter(
+                    assignment_id__in=[item.assignment_id for item in stored]
+                ).delete()
+            n_moved += len(assignments)
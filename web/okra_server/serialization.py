@@ -0,0 +1,102 @@
+import json
+from typing import Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http.response import HttpResponse
+
+from okra_server.exceptions import RequestBodyTooLarge
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _dumps_django(data) -> bytes:
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+def _dumps_orjson(data) -> bytes:
+    # orjson handles UUIDs and datetimes natively, other types (e.g. lazy strings)
+    # fall back to Django's encoder
+    return orjson.dumps(
+        data,
+        default=DjangoJSONEncoder().default,
+        option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+JSON_BACKENDS = {
+    "django": _dumps_django,
+    "orjson": _dumps_orjson,
+}
+JSON_DECODERS = {
+    "django": json.loads,
+    "orjson": orjson.loads if orjson is not None else None,
+}
+
+
+def _get_backend_name(name: str = None) -> str:
+    name = name or settings.JSON_BACKEND
+    if name == "auto":
+        name = "orjson" if orjson is not None else "django"
+    return name
+
+
+def get_json_backend(name: str = None):
+    return JSON_BACKENDS[_get_backend_name(name)]
+
+
+def dumps(data) -> bytes:
+    """Encode data as JSON using the backend configured in `JSON_BACKEND`."""
+    return get_json_backend()(data)
+
+
+def loads(data):
+    """Decode JSON from bytes or bytearray using the backend configured in
+    `JSON_BACKEND`. Raises `json.JSONDecodeError` for invalid JSON."""
+    return JSON_DECODERS[_get_backend_name()](data)
+
+
+def load_body(
+    stream,
+    content_length: Optional[int],
+    max_size: int,
+    chunk_size: int = 65536,
+):
+    """Read and decode a JSON request body from a stream (None if it is empty).
+
+    Raises `RequestBodyTooLarge` if `content_length` exceeds `max_size`, before
+    reading anything. Without a content length (e.g. chunked requests), the stream
+    is read to its end, raising `RequestBodyTooLarge` as soon as more than
+    `max_size` bytes have been read. The raw body is read in chunks into a buffer
+    that is not kept around once it has been decoded.
+    """
+    if content_length is not None and content_length > max_size:
+        raise RequestBodyTooLarge()
+    limit = max_size + 1 if content_length is None else content_length
+    body = bytearray()
+    while len(body) < limit:
+        chunk = stream.read(min(chunk_size, limit - len(body)))
+        if not chunk:
+            break
+        body += chunk
+    if len(body) > max_size:
+        raise RequestBodyTooLarge()
+    if not body:
+        return None
+    return loads(body)
+
+
+class JsonResponse(HttpResponse):
+    """Drop-in replacement for Django's `JsonResponse` using `dumps`."""
+
+    def __init__(self, data, safe: bool = True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
@@ -26,6 +26,7 @@ else:
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "X-Participant-ID",
     "X-Device-Key",
+    "Idempotency-Key",
 ]
 
 INSTALLED_APPS = [
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "okra_server.middleware.JsonCompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -75,6 +77,9 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Unlike the default in-memory database, a file allows concurrent
+        # connections from multiple threads in tests
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -108,7 +113,93 @@ if FORCE_SCRIPT_NAME is not None:
 
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Process-local cache, e.g. for rendered QR codes
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+
+# Messages of the app (e.g. credential cache statistics) are written to stderr
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "okra_server": {
+            "handlers": ["console"],
+            "level": os.getenv("OKRA_LOG_LEVEL", "INFO"),
+        },
+    },
+}
+
 API_INFO = {
     "name": os.getenv("API_NAME", "Development API"),
     "icon_url": os.getenv("API_ICON_URL"),
 }
+
+# Verified participant credentials are cached per process (set size to 0 to disable).
+# Credentials revoked in another process (e.g. another worker or a management
+# command) stay valid in the cache of a worker for up to `ttl` seconds. Hit and miss
+# counters are logged every `stats_interval` seconds (0 to disable)
+API_CREDENTIAL_CACHE = {
+    "max_size": int(os.getenv("API_CREDENTIAL_CACHE_SIZE", "1024")),
+    "ttl": float(os.getenv("API_CREDENTIAL_CACHE_TTL", "60")),
+    "stats_interval": float(os.getenv("API_CREDENTIAL_CACHE_STATS_INTERVAL", "0")),
+}
+
+# JSON encoder for responses ("orjson", "django" or "auto" to use orjson if installed)
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+# Compress JSON responses with gzip (or brotli if the brotli package is installed)
+JSON_RESPONSE_COMPRESSION = os.getenv("JSON_RESPONSE_COMPRESSION") == "true"
+
+# Maximum size of API request bodies in bytes (larger requests are rejected with
+# 413), can be overridden per view function. Under ASGI, Django has already
+# received the whole body at this point, so limit it in the proxy server as well
+API_MAX_BODY_SIZE = int(os.getenv("API_MAX_BODY_SIZE", str(2_621_440)))
+API_MAX_RESULTS_SIZE = int(os.getenv("API_MAX_RESULTS_SIZE", str(50 * 1024 * 1024)))
+API_MAX_BODY_SIZES = {
+    "finish_task": API_MAX_RESULTS_SIZE,
+    "finish_tasks": API_MAX_RESULTS_SIZE,
+}
+
+# Seconds for which outcomes of requests with an Idempotency-Key header are replayed
+API_IDEMPOTENCY_KEY_TTL = int(os.getenv("API_IDEMPOTENCY_KEY_TTL", str(24 * 60 * 60)))
+
+# Storage of task results: "inline" (JSON column of the assignments table) or
+# "compressed" (zstd if the zstandard package is installed, gzip otherwise, in a
+# separate table). Use the moveresults command after changing this setting.
+RESULTS_STORAGE = os.getenv("RESULTS_STORAGE", "inline")
+
+# Storage of task data: "inline" (JSON column of the tasks table) or "deduplicated"
+# (tasks with identical data share one row, identified by its SHA-256 hash)
+TASK_DATA_STORAGE = os.getenv("TASK_DATA_STORAGE", "inline")
+
+# Directory to which task data is written for serving by nginx (disabled if unset).
+# Files are sent through X-Accel-Redirect to the given internal nginx location, or
+# by Django itself if that is empty.
+TASK_DATA_ROOT = os.getenv("TASK_DATA_ROOT")
+TASK_DATA_ACCEL_REDIRECT_URL = os.getenv(
+    "TASK_DATA_ACCEL_REDIRECT_URL", "/protected/task-data/"
+)
+
+# Image format of registration QR codes ("svg" or "png")
+QR_CODE_FORMAT = os.getenv("QR_CODE_FORMAT", "svg")
+
+# Maximum number of participants created at once through the web interface
+MAX_NEW_PARTICIPANTS = int(os.getenv("MAX_NEW_PARTICIPANTS", "1000"))
+
+# Number of participants (and task data) loaded at once in the experiment editor
+EDITOR_PAGE_SIZE = int(os.getenv("EDITOR_PAGE_SIZE", "100"))
+
+# Number of participants per page on the progress page
+PROGRESS_PAGE_SIZE = int(os.getenv("PROGRESS_PAGE_SIZE", "50"))
+# Maximum duration of progress update requests and interval of checking for updates
+# during them (in seconds)
+PROGRESS_POLL_TIMEOUT = float(os.getenv("PROGRESS_POLL_TIMEOUT", "25"))
+PROGRESS_POLL_INTERVAL = float(os.getenv("PROGRESS_POLL_INTERVAL", "1"))
+
+# Delay before finished assignments are included in incremental results exports (in
+# seconds), which must exceed the duration of transactions finishing tasks
+RESULTS_EXPORT_SETTLE_TIME = float(os.getenv("RESULTS_EXPORT_SETTLE_TIME", "10"))
@@ -51,14 +51,15 @@ Vue.component("experiment-form", {
         <div class="accordion mb-2">
           <div class="accordion-item" v-for="(task, i) in data.tasks" :key="'task-' + task.id">
             <h3 class="accordion-header">
-              <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" :data-bs-target="'#task-collapse-' + task.id">
-                <button type="button" class="btn btn-outline-danger btn-sm me-2" @click="removeTask(i)"><i class="bi bi-trash-fill"></i></button>
+              <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" :data-bs-target="'#task-collapse-' + task.id" @click="loadTaskData(i)">
+                <button type="button" class="btn btn-outline-danger btn-sm me-2" @click.stop="removeTask(i)"><i class="bi bi-trash-fill"></i></button>
                 {{ task.label }}
               </button>
             </h3>
             <div class="accordion-collapse collapse hide" :id="'task-collapse-' + task.id">
               <div class="accordion-body">
-                <task v-model="data.tasks[i]"></task>
+                <task v-if="'data' in task" v-model="data.tasks[i]"></task>
+                <div v-else class="spinner-border spinner-border-sm" role="status"></div>
               </div>
             </div>
           </div>
@@ -92,12 +93,15 @@ Vue.component("experiment-form", {
       </section>
       <section>
         <h2>Assignments</h2>
-        <ul class="list-group">
-          <li class="list-group-item" v-for="(label, id) in participantLabels" :key="'participant-' + id">
-            <h3 class="h6">Participant: {{ label }} ({{ id }})</h3>
-            <task-assignments :tasks="data.tasks" v-model="data.assignments[id]"></task-assignments>
+        <ul class="list-group mb-2">
+          <li class="list-group-item" v-for="participant in participants" :key="'participant-' + participant.id">
+            <h3 class="h6">Participant: {{ participant.label }} ({{ participant.id }})</h3>
+            <task-assignments :tasks="data.tasks" v-model="data.assignments[participant.id]"></task-assignments>
           </li>
         </ul>
+        <button type="button" class="btn btn-outline-primary" v-if="participantsPage < nParticipantPages" :disabled="loadingParticipants" @click="loadParticipants()">
+          Load more participants ({{ participants.length }} of {{ nParticipants }})
+        </button>
       </section>
     </div>
   `,
@@ -119,8 +123,12 @@ Vue.component("experiment-form", {
       type: Object,
       required: true,
     },
-    participantLabels: {
-      type: Object,
+    assignmentsUrl: {
+      type: String,
+      required: true,
+    },
+    tasksUrl: {
+      type: String,
       required: true,
     },
   },
@@ -133,10 +141,70 @@ Vue.component("experiment-form", {
       data: { ...this.value },
       taskKeyCounter,
       hasPracticeTask,
+      participants: [],
+      participantsPage: 0,
+      nParticipantPages: null,
+      nParticipants: null,
+      loadingParticipants: false,
     };
   },
 
+  mounted() {
+    this.loadParticipants();
+  },
+
   methods: {
+    loadParticipants() {
+      // Only the assignments of loaded participants are saved
+      this.loadingParticipants = true;
+      axios
+        .get(this.assignmentsUrl, {
+          params: { page: this.participantsPage + 1 },
+        })
+        .then((response) => {
+          for (const participant of response.data.participants) {
+            this.$set(
+              this.data.assignments,
+              participant.id,
+              participant.assignments
+            );
+            this.participants.push(participant);
+          }
+          this.participantsPage = response.data.page;
+          this.nParticipantPages = response.data.nPages;
+          this.nParticipants = response.data.nParticipants;
+        })
+        .finally(() => {
+          this.loadingParticipants = false;
+        });
+    },
+
+    loadTaskData(index) {
+      // The data of tasks that are never opened is not sent when saving
+      const task = this.data.tasks[index];
+      if (task === undefined || "data" in task) {
+        return;
+      }
+      axios
+        .get(this.tasksUrl, {
+          params: new URLSearchParams([["id", task.id]]),
+        })
+        .then((response) => {
+          for (const loadedTask of response.data.tasks) {
+            const i = this.data.tasks.findIndex(
+              (task) => task.id === loadedTask.id
+            );
+            if (i !== -1 && !("data" in this.data.tasks[i])) {
+              this.$set(this.data.tasks, i, {
+                ...this.data.tasks[i],
+                data: loadedTask.data,
+              });
+            }
+          }
+          this.emitData();
+        });
+    },
+
     addPracticeTask() {
       this.data.practiceTask = {
         id: uuidv4(),
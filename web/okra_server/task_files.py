@@ -0,0 +1,53 @@
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+from okra_server.serialization import dumps
+
+re_data_hash = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_enabled() -> bool:
+    return bool(settings.TASK_DATA_ROOT)
+
+
+def get_relative_path(data_hash: str) -> Optional[str]:
+    """Return the path of a task data file relative to `TASK_DATA_ROOT`, or None
+    if the hash is invalid."""
+    if not re_data_hash.match(data_hash):
+        return None
+    return f"{data_hash[:2]}/{data_hash}.json"
+
+
+def get_path(data_hash: str) -> Optional[Path]:
+    relative_path = get_relative_path(data_hash)
+    if relative_path is None:
+        return None
+    return Path(settings.TASK_DATA_ROOT) / relative_path
+
+
+def write_task_data_file(task) -> str:
+    """Write the data of a task to a file named after its hash, unless it exists
+    already. Returns the hash.
+
+    Files are never changed once written, since their name depends on the content.
+    """
+    data_hash = task.get_data_hash()
+    path = get_path(data_hash)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that nginx never serves partial files
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(dumps(task.get_data()))
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    return data_hash
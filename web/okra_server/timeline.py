@@ -0,0 +1,102 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+
+from okra_server.events import get_event_offsets
+
+# Bump when the format of cached timelines changes
+TIMELINE_VERSION = 1
+PIXELS_PER_SECOND = 100
+# Events of the same label closer than this (in pixels) are drawn as one point
+MIN_POINT_SPACING = 2
+MAX_POINTS = 1000
+
+
+def get_label_color(label: str) -> str:
+    """Return a color for an event label, the same on every page view."""
+    hue = int(hashlib.sha256(str(label).encode()).hexdigest()[:8], 16) % 360
+    return f"hsl({hue}, 70%, 40%)"
+
+
+def compute_timeline(events: List[dict], max_points: int = MAX_POINTS) -> dict:
+    """Compute the points of a task's events on a timeline graph.
+
+    Events of the same label that would be drawn within `MIN_POINT_SPACING` pixels
+    (or more for wide graphs, so that there are at most about `max_points`
+    points) are merged into one point with their number as `count`.
+    """
+    offsets = get_event_offsets(events)
+    width = (offsets[-1] if offsets else 0) * PIXELS_PER_SECOND
+    spacing = max(MIN_POINT_SPACING, width / max_points)
+    points = []
+    buckets = {}
+    for event, offset in zip(events, offsets):
+        x = offset * PIXELS_PER_SECOND
+        label = event.get("label")
+        key = (label, int(x // spacing))
+        point = buckets.get(key)
+        if point is None:
+            point = buckets[key] = {
+                "x": round(x, 1),
+                "label": label,
+                "color": get_label_color(label),
+                "count": 0,
+            }
+            points.append(point)
+        point["count"] += 1
+    return {
+        "width": round(width) + 20,
+        "points": points,
+        "n_events": len(events),
+    }
+
+
+def _get_cache_key(assignment) -> str:
+    # Results do not change once a task is finished
+    return (
+        f"timeline:{TIMELINE_VERSION}:{assignment.id}:"
+        f"{assignment.finished_time.timestamp()}"
+    )
+
+
+def get_timelines(assignments: Iterable, load_results) -> Dict[int, Optional[dict]]:
+    """Return the timelines of the finished assignments among `assignments` by
+    assignment ID (None if there are no events), from the cache where possible.
+    Canceled assignments have no results and are left out.
+
+    `load_results` is called with the IDs of assignments whose timelines are not
+    cached and returns their results by ID, so that the results of cached ones
+    are never loaded.
+    """
+    assignments = [
+        assignment
+        for assignment in assignments
+        if assignment.finished_time is not None and not assignment.canceled
+    ]
+    cache_keys = {
+        assignment.id: _get_cache_key(assignment) for assignment in assignments
+    }
+    cached = cache.get_many(cache_keys.values())
+    timelines = {
+        assignment_id: cached[cache_key]
+        for assignment_id, cache_key in cache_keys.items()
+        if cache_key in cached
+    }
+    missing_ids = [
+        assignment_id for assignment_id in cache_keys if assignment_id not in timelines
+    ]
+    if missing_ids:
+        new_timelines = {}
+        for assignment_id, results in load_results(missing_ids).items():
+            events = (results or {}).get("events") or []
+            new_timelines[assignment_id] = compute_timeline(events) if events else None
+        cache.set_many(
+            {
+                cache_keys[assignment_id]: timeline
+                for assignment_id, timeline in new_timelines.items()
+            },
+            timeout=None,
+        )
+        timelines.update(new_timelines)
+    return timelines
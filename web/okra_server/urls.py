@@ -21,11 +21,21 @@ urlpatterns = [
         login_required(views.progress),
         name="progress",
     ),
+    path(
+        "progress/<uuid:experiment_id>/updates",
+        views.progress_updates,
+        name="progress-updates",
+    ),
     path(
         "registration/<participant_id>",
         views.registration_detail,
         name="registration-detail",
     ),
+    path(
+        "registration/<participant_id>/qr.<image_format>",
+        views.registration_qr_code,
+        name="registration-qr-code",
+    ),
     path(
         "experiments",
         login_required(views.ExperimentList.as_view()),
@@ -41,11 +51,26 @@ urlpatterns = [
         staff_required(views.ExperimentDetail.as_view()),
         name="experiment-detail",
     ),
+    path(
+        "experiments/<uuid:experiment_id>/assignments",
+        staff_required(views.experiment_assignments),
+        name="experiment-assignments",
+    ),
+    path(
+        "experiments/<uuid:experiment_id>/tasks",
+        staff_required(views.experiment_tasks),
+        name="experiment-tasks",
+    ),
     path(
         "experiments/<uuid:experiment_id>/results",
         staff_required(views.experiment_results),
         name="experiment-results",
     ),
+    path(
+        "experiments/<uuid:experiment_id>/events.<str:file_format>",
+        staff_required(views.experiment_events),
+        name="experiment-events",
+    ),
     path(
         "experiments/<uuid:experiment_id>/results/<uuid:participant_id>/graph",
         staff_required(views.experiment_results_graph),
@@ -71,6 +96,16 @@ urlpatterns = [
         staff_required(views.new_participant),
         name="participant-new",
     ),
+    path(
+        "participants/new-batch",
+        staff_required(views.new_participants),
+        name="participant-new-batch",
+    ),
+    path(
+        "participants/sheet",
+        staff_required(views.participant_sheet),
+        name="participant-sheet",
+    ),
     path(
         "participants/<uuid:participant_id>/label",
         staff_required(views.label_participant),
@@ -1,20 +1,26 @@
-import base64
-import io
+import asyncio
+import copy
 import itertools
 import json
-import random
+import tempfile
+import time
 import uuid
-from datetime import datetime
+from typing import Dict, List, Optional
 
-import qrcode
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import auth
-from django.http.response import HttpResponse, JsonResponse
+from django.contrib.auth.views import redirect_to_login
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http.response import FileResponse, HttpResponse
 from django.shortcuts import redirect, render, reverse
+from django.utils.http import urlencode
 from django.views.decorators.http import require_POST
 from django.views.generic import ListView, View
 
-from okra_server import models
+from okra_server import exceptions, export, models, qr, timeline
+from okra_server.serialization import JsonResponse
 
 
 def api_info(request):
@@ -37,37 +43,36 @@ def index(request):
     )
 
 
+def _serialize_progress(participant: models.Participant) -> dict:
+    # Expects a participant from `Experiment.get_progress` (annotated with counts)
+    n_tasks = participant.n_tasks
+    return {
+        "id": str(participant.id),
+        "label": participant.label,
+        "n_practice_tasks_finished": participant.n_practice_tasks_finished,
+        "n_tasks": n_tasks,
+        "n_tasks_unfinished": participant.n_tasks_unfinished,
+        "percent_tasks_unfinished": (
+            participant.n_tasks_unfinished / (n_tasks or 1) * 100
+        ),
+        "n_tasks_finished": participant.n_tasks_finished,
+        "percent_tasks_finished": participant.n_tasks_finished / (n_tasks or 1) * 100,
+        "n_tasks_canceled": participant.n_tasks_canceled,
+        "percent_tasks_canceled": participant.n_tasks_canceled / (n_tasks or 1) * 100,
+    }
+
+
 def progress(request, experiment_id):
-    participants = models.Participant.objects.all()
-    participants_data = []
     experiment = models.Experiment.objects.get(id=experiment_id)
-    for participant in participants:
-        n_tasks = experiment.get_n_tasks(participant)
-        n_tasks_unfinished = experiment.get_n_tasks(
-            participant, started=True, finished=False, canceled=False
-        )
-        n_tasks_finished = experiment.get_n_tasks(
-            participant, started=True, finished=True, canceled=False
-        )
-        n_tasks_canceled = experiment.get_n_tasks(
-            participant, started=True, finished=True, canceled=True
-        )
-        participants_data.append(
-            {
-                "id": str(participant.id),
-                "label": participant.label,
-                "n_practice_tasks_finished": experiment.get_n_tasks(
-                    participant, practice=True, finished=True, canceled=False
-                ),
-                "n_tasks": n_tasks,
-                "n_tasks_unfinished": n_tasks_unfinished,
-                "percent_tasks_unfinished": n_tasks_unfinished / (n_tasks or 1) * 100,
-                "n_tasks_finished": n_tasks_finished,
-                "percent_tasks_finished": n_tasks_finished / (n_tasks or 1) * 100,
-                "n_tasks_canceled": n_tasks_canceled,
-                "percent_tasks_canceled": n_tasks_canceled / (n_tasks or 1) * 100,
-            }
-        )
+    # Updates are pushed for changes after this point
+    cursor = models.AssignmentsSequence.current()
+    label = request.GET.get("label", "")
+    participants = experiment.get_progress()
+    if label:
+        participants = participants.filter(label__icontains=label)
+    page = Paginator(participants, settings.PROGRESS_PAGE_SIZE).get_page(
+        request.GET.get("page")
+    )
     return render(
         request,
         "okra_server/progress.html",
@@ -77,22 +82,73 @@ def progress(request, experiment_id):
                 "title": experiment.title,
                 "task_type": dict(models.TaskType.choices)[experiment.task_type],
             },
-            "participants": participants_data,
+            "participants": [_serialize_progress(participant) for participant in page],
+            "page": page,
+            "label": label,
+            "cursor": cursor,
+            "event_file_formats": export.get_event_file_formats(),
         },
     )
 
 
+async def progress_updates(request, experiment_id):
+    """Long-poll for progress of participants whose assignments changed after the
+    `since` cursor, a number of `models.AssignmentsSequence`.
+
+    Responds as soon as there are changes, or after `PROGRESS_POLL_TIMEOUT`
+    seconds without them. The database is checked every `PROGRESS_POLL_INTERVAL`
+    seconds, without occupying a thread while waiting.
+    """
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return redirect_to_login(request.get_full_path())
+    since = request.GET.get("since", "")
+    if not since.isdigit():
+        return JsonResponse({"message": "Invalid cursor"}, status=400)
+    since = int(since)
+
+    def get_changes():
+        experiment = models.Experiment.objects.get(id=experiment_id)
+        return [
+            (participant.assignments_sequence, _serialize_progress(participant))
+            for participant in experiment.get_progress().filter(
+                assignments_sequence__gt=since
+            )
+        ]
+
+    deadline = time.monotonic() + settings.PROGRESS_POLL_TIMEOUT
+    while True:
+        changes = await sync_to_async(get_changes)()
+        if changes or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(settings.PROGRESS_POLL_INTERVAL)
+    return JsonResponse(
+        {
+            "cursor": max([since] + [sequence for sequence, _ in changes]),
+            "participants": [participant for _, participant in changes],
+        }
+    )
+
+
+def _get_base_url(request) -> str:
+    return request.build_absolute_uri(reverse("api:base")).rstrip("/")
+
+
 def registration_detail(request, participant_id):
     participant = models.Participant.objects.get(id=participant_id)
     if participant.device_key is not None:
         return HttpResponse("already registered", status=404)
 
-    base_url = request.build_absolute_uri(reverse("api:base")).rstrip("/")
-    data = f"{base_url}\n" f"{participant.id}\n" f"{participant.registration_key}"
-    image = qrcode.make(data)
-    image_bytes = io.BytesIO()
-    image.save(image_bytes, "PNG")
-    image_base64 = base64.b64encode(image_bytes.getvalue())
+    base_url = _get_base_url(request)
+    image_format = settings.QR_CODE_FORMAT
+    # The image is served separately, so that browsers can cache it
+    qr_url = (
+        reverse(
+            "registration-qr-code",
+            kwargs={"participant_id": participant.id, "image_format": image_format},
+        )
+        + "?v="
+        + qr.get_qr_code_version(qr.get_registration_data(base_url, participant))
+    )
 
     return render(
         request,
@@ -101,18 +157,69 @@ def registration_detail(request, participant_id):
             "base_url": base_url,
             "participant_id": participant.id,
             "registration_key": participant.registration_key,
-            "qr_data": image_base64.decode("ascii"),
+            "qr_url": qr_url,
         },
     )
 
 
+def registration_qr_code(request, participant_id, image_format):
+    if image_format not in qr.QR_CODE_CONTENT_TYPES:
+        return HttpResponse("unknown format", status=404)
+    participant = models.Participant.objects.get(id=participant_id)
+    if participant.device_key is not None:
+        return HttpResponse("already registered", status=404)
+
+    response = HttpResponse(
+        qr.get_qr_code(
+            qr.get_registration_data(_get_base_url(request), participant), image_format
+        ),
+        content_type=qr.QR_CODE_CONTENT_TYPES[image_format],
+    )
+    # URLs of changed QR codes differ in their version parameter
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+
+def _try_uuid(value) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def _parse_uuid(value, name: str) -> uuid.UUID:
+    parsed = _try_uuid(value)
+    if parsed is None:
+        raise exceptions.InvalidExperimentData(f"Invalid {name} {value!r}")
+    return parsed
+
+
+def _get_task_state(task: models.Task) -> tuple:
+    return task.experiment_id, task.label, task.data, task.shared_data_id
+
+
+def _get_rating_state(rating: models.TaskRating) -> tuple:
+    return rating.question, rating.rating_type, rating.low_extreme, rating.high_extreme
+
+
+def _get_unique(objects_by_label: Dict[str, list], label: str, name: str):
+    objects = objects_by_label.get(label, [])
+    if not objects:
+        raise exceptions.InvalidExperimentData(f"Unknown {name}")
+    if len(objects) > 1:
+        raise exceptions.InvalidExperimentData(f"Ambiguous {name}")
+    return objects[0]
+
+
 class ExperimentList(ListView):
     model = models.Experiment
 
 
 class ExperimentDetail(View):
     def get(self, request, experiment_id=None):
-        experiment = self._get_experiment(experiment_id)
+        experiment = self._get_experiment(
+            experiment_id, select_related=["practice_task__shared_data"]
+        )
         return render(
             request,
             "okra_server/experiment_detail.html",
@@ -133,18 +240,18 @@ class ExperimentDetail(View):
                         {
                             "id": str(experiment.practice_task.id),
                             "label": experiment.practice_task.label,
-                            "data": experiment.practice_task.data,
+                            "data": experiment.practice_task.get_data(),
                         }
                         if experiment.practice_task is not None
                         else None
                     ),
+                    # Task data and assignments are loaded on demand (see
+                    # `experiment_tasks` and `experiment_assignments`)
                     "tasks": [
-                        {
-                            "id": str(task.id),
-                            "label": task.label,
-                            "data": task.data,
-                        }
-                        for task in experiment.tasks.all()
+                        {"id": str(task_id), "label": label}
+                        for task_id, label in experiment.tasks.values_list(
+                            "id", "label"
+                        )
                     ],
                     "ratings": [
                         {
@@ -161,16 +268,7 @@ class ExperimentDetail(View):
                         for required_experiment in experiment.required_experiments.all()
                         if required_experiment != experiment
                     ],
-                    "assignments": {
-                        str(participant.id): [
-                            {
-                                "id": str(assignment.task.id),
-                                "started": assignment.started_time is not None,
-                            }
-                            for assignment in experiment.get_assignments(participant)
-                        ]
-                        for participant in models.Participant.objects.all()
-                    },
+                    "assignments": {},
                 },
                 "task_type_choices": {
                     type_id: type_name for type_id, type_name in models.TaskType.choices
@@ -180,12 +278,10 @@ class ExperimentDetail(View):
                     for type_id, type_name in models.TaskRatingType.choices
                 },
                 "experiment_titles": {
-                    str(experiment.id): experiment.title
-                    for experiment in models.Experiment.objects.all()
-                },
-                "participant_labels": {
-                    str(participant.id): participant.label
-                    for participant in models.Participant.objects.all()
+                    str(experiment_id): title
+                    for experiment_id, title in models.Experiment.objects.values_list(
+                        "id", "title"
+                    )
                 },
             },
         )
@@ -193,106 +289,290 @@ class ExperimentDetail(View):
     def post(self, request, experiment_id=None):
         data = json.loads(request.body)
         experiment_id = experiment_id or data.get("id")
-        experiment = self._get_experiment(experiment_id)
 
         try:
-            experiment.task_type = data["taskType"]
-            experiment.title = data["title"]
-            experiment.instructions = data["instructions"]
-            experiment.instructions_after_task = data["instructionsAfterTask"]
-            experiment.instructions_after_practice_task = data[
-                "instructionsAfterPracticeTask"
-            ]
-            experiment.instructions_after_final_task = data[
-                "instructionsAfterFinalTask"
-            ]
-
-            practice_task_data = data["practiceTask"]
-            if experiment.practice_task is not None and (
-                practice_task_data is None
-                or "id" not in practice_task_data
-                or experiment.practice_task.id != uuid.UUID(practice_task_data["id"])
-            ):
-                experiment.practice_task.delete()
-                experiment.practice_task = None
-            if practice_task_data is not None:
-                experiment.practice_task = self._get_task(practice_task_data.get("id"))
-                experiment.practice_task.label = practice_task_data["label"]
-                experiment.practice_task.data = practice_task_data["data"]
-                experiment.practice_task.save()
-
-            experiment.save()
-
-            tasks_to_delete = set(experiment.tasks.all())
-            for task_data in data["tasks"]:
-                task = self._get_task(task_data.get("id"))
-                if task in tasks_to_delete:
-                    tasks_to_delete.remove(task)
-                task.experiment = experiment
-                task.label = task_data["label"]
-                task.data = task_data["data"]
-                task.save()
-            for task in tasks_to_delete:
-                task.delete()
-
-            experiment.required_experiments.set(data.get("requirements", []))
-
-            for participant_id, assignments in data["assignments"].items():
-                try:
-                    participant_id = uuid.UUID(participant_id)
-                    participant = models.Participant.objects.get(id=participant_id)
-                except (models.Participant.DoesNotExist, ValueError):
-                    participant = models.Participant.objects.get(label=participant_id)
-                experiment.get_assignments(participant).filter(
-                    started_time__isnull=True
-                ).delete()
-                for assignment in assignments:
-                    if "id" in assignment:
-                        task = experiment.tasks.get(id=assignment["id"])
-                    elif "label" in assignment:
-                        task = experiment.tasks.get(label=assignment["label"])
-                    else:
-                        return JsonResponse(
-                            {"message": "Missing task ID or label"},
-                            status=400,
-                        )
-                    if assignment.get("started", False):
-                        continue
-                    models.TaskAssignment.objects.create(
-                        participant=participant,
-                        task=task,
-                    )
-
-            experiment.ratings.all().delete()
-            for rating_data in data["ratings"]:
-                rating = self._get_rating(rating_data.get("id"))
-                rating.experiment = experiment
-                rating.question = rating_data["question"]
-                rating.rating_type = rating_data["type"]
-                rating.low_extreme = rating_data["lowExtreme"]
-                rating.high_extreme = rating_data["highExtreme"]
-                rating.save()
-
-            return JsonResponse(
-                {
-                    "message": "Saved",
-                    "redirect": reverse(
-                        "experiment-detail", kwargs={"experiment_id": experiment.id}
-                    ),
-                },
-                status=200,
-            )
+            # Changes are computed up front and applied in bulk, and nothing is
+            # saved if any part of the data is invalid
+            with transaction.atomic():
+                experiment = self._get_experiment(experiment_id)
+                self._save_experiment(experiment, data)
+                tasks = self._save_tasks(experiment, data["tasks"])
+                experiment.set_required_experiments(data.get("requirements", []))
+                self._save_assignments(experiment, tasks, data["assignments"])
+                self._save_ratings(experiment, data["ratings"])
         except KeyError as e:
             return JsonResponse(
                 {"message": f"Missing key: {e}"},
                 status=400,
             )
+        except exceptions.CyclicRequirements:
+            return JsonResponse(
+                {"message": "Cyclic requirements"},
+                status=400,
+            )
+        except exceptions.InvalidExperimentData as e:
+            return JsonResponse(
+                {"message": str(e)},
+                status=400,
+            )
+        return JsonResponse(
+            {
+                "message": "Saved",
+                "redirect": reverse(
+                    "experiment-detail", kwargs={"experiment_id": experiment.id}
+                ),
+            },
+            status=200,
+        )
+
+    def _save_experiment(self, experiment: models.Experiment, data: dict):
+        experiment.task_type = data["taskType"]
+        experiment.title = data["title"]
+        experiment.instructions = data["instructions"]
+        experiment.instructions_after_task = data["instructionsAfterTask"]
+        experiment.instructions_after_practice_task = data[
+            "instructionsAfterPracticeTask"
+        ]
+        experiment.instructions_after_final_task = data["instructionsAfterFinalTask"]
+
+        practice_task_data = data["practiceTask"]
+        if experiment.practice_task is not None and (
+            practice_task_data is None
+            or "id" not in practice_task_data
+            or experiment.practice_task.id != uuid.UUID(practice_task_data["id"])
+        ):
+            models.ProgressCounter.record_deleted(
+                experiment.practice_task.assignments.all()
+            )
+            experiment.practice_task.delete()
+            experiment.practice_task = None
+        if practice_task_data is not None:
+            experiment.practice_task = self._get_task(practice_task_data.get("id"))
+            experiment.practice_task.label = practice_task_data["label"]
+            experiment.practice_task.set_data(practice_task_data["data"])
+            experiment.practice_task.save()
+
+        experiment.save()
+
+    @staticmethod
+    def _save_tasks(
+        experiment: models.Experiment, tasks_data: List[dict]
+    ) -> List[models.Task]:
+        """Create, update and delete the tasks of an experiment in bulk. Returns the
+        tasks in the given order."""
+        task_ids = [
+            _parse_uuid(task_data["id"], "task ID")
+            for task_data in tasks_data
+            if task_data.get("id") is not None
+        ]
+        existing_tasks = models.Task.objects.in_bulk(task_ids)
+        tasks_to_delete = dict(
+            experiment.tasks.exclude(id__in=task_ids).values_list(
+                "id", "shared_data_id"
+            )
+        )
+
+        tasks = []
+        new_tasks = []
+        existing_states = {}
+        # The data of tasks is only sent if it was loaded in the editor
+        data_tasks = []
+        data = []
+        for task_data in tasks_data:
+            task_id = task_data.get("id")
+            task = existing_tasks.get(_try_uuid(task_id))
+            if task is None:
+                task = models.Task(experiment=experiment)
+                if task_id is not None:
+                    task.id = _try_uuid(task_id)
+                new_tasks.append(task)
+                data_tasks.append(task)
+                data.append(task_data["data"])
+            else:
+                existing_states[task.id] = _get_task_state(task)
+                if "data" in task_data:
+                    data_tasks.append(task)
+                    data.append(task_data["data"])
+            task.experiment = experiment
+            task.label = task_data["label"]
+            tasks.append(task)
+
+        replaced_hashes = models.Task.set_data_many(data_tasks, data)
+        models.Task.objects.bulk_create(new_tasks)
+        # Only tasks that changed are written
+        updated_tasks = [
+            task
+            for task in tasks
+            if task.id in existing_states
+            and _get_task_state(task) != existing_states[task.id]
+        ]
+        models.Task.objects.bulk_update(
+            updated_tasks, ["experiment", "label", "data", "shared_data"]
+        )
+        if tasks_to_delete:
+            deleted_assignments = models.TaskAssignment.objects.filter(
+                task_id__in=tasks_to_delete
+            )
+            models.ProgressCounter.record_deleted(deleted_assignments)
+            models.TaskAssignment.delete_all(deleted_assignments)
+            models.Task.objects.filter(id__in=tasks_to_delete).delete()
+        models.TaskData.delete_unreferenced(
+            replaced_hashes | set(tasks_to_delete.values()) - {None}
+        )
+        return tasks
+
+    @staticmethod
+    def _save_assignments(
+        experiment: models.Experiment,
+        tasks: List[models.Task],
+        assignments_data: Dict[str, List[dict]],
+    ):
+        """Replace the unstarted assignments of the given participants (by ID or
+        label) with assignments of the given tasks, in order."""
+        participants_by_id = models.Participant.objects.in_bulk(
+            {_try_uuid(key) for key in assignments_data} - {None}
+        )
+        participants_by_label = {}
+        for participant in models.Participant.objects.filter(
+            label__in=[key for key in assignments_data if key not in participants_by_id]
+        ):
+            participants_by_label.setdefault(participant.label, []).append(participant)
+        tasks_by_id = {str(task.id): task for task in tasks}
+        tasks_by_label = {}
+        for task in tasks:
+            tasks_by_label.setdefault(task.label, []).append(task)
+
+        new_task_ids = {}
+        for key, participant_assignments in assignments_data.items():
+            participant = participants_by_id.get(_try_uuid(key))
+            if participant is None:
+                participant = _get_unique(
+                    participants_by_label, key, f"participant {key!r}"
+                )
+            task_ids = new_task_ids.setdefault(participant.id, [])
+            for assignment in participant_assignments:
+                if "id" in assignment:
+                    task = tasks_by_id.get(str(assignment["id"]))
+                    if task is None:
+                        raise exceptions.InvalidExperimentData(
+                            f"Unknown task {assignment['id']!r}"
+                        )
+                elif "label" in assignment:
+                    task = _get_unique(
+                        tasks_by_label,
+                        assignment["label"],
+                        f"task {assignment['label']!r}",
+                    )
+                else:
+                    raise exceptions.InvalidExperimentData("Missing task ID or label")
+                if not assignment.get("started", False):
+                    task_ids.append(task.id)
+
+        existing_assignments = {participant_id: [] for participant_id in new_task_ids}
+        for assignment in models.TaskAssignment.objects.filter(
+            participant_id__in=new_task_ids,
+            task__experiment=experiment,
+            started_time__isnull=True,
+        ).defer("results"):
+            existing_assignments[assignment.participant_id].append(assignment)
+
+        # Tasks are started in the order of their assignments' IDs. Unstarted
+        # assignments have no other data, so existing ones are given the first
+        # tasks in order, instead of deleting and recreating them all.
+        changes = []
+        updated_assignments = []
+        new_assignments = []
+        ids_to_delete = []
+        changed_participant_ids = set()
+        for participant_id, task_ids in new_task_ids.items():
+            assignments = existing_assignments[participant_id]
+            for assignment, task_id in zip(assignments, task_ids):
+                if assignment.task_id != task_id:
+                    state = assignment.get_progress_state()
+                    changes.append((copy.copy(assignment), state, None))
+                    assignment.task_id = task_id
+                    changes.append((assignment, None, state))
+                    updated_assignments.append(assignment)
+                    changed_participant_ids.add(participant_id)
+            for assignment in assignments[len(task_ids) :]:
+                changes.append((assignment, assignment.get_progress_state(), None))
+                ids_to_delete.append(assignment.id)
+                changed_participant_ids.add(participant_id)
+            for task_id in task_ids[len(assignments) :]:
+                new_assignments.append(
+                    models.TaskAssignment(
+                        participant_id=participant_id, task_id=task_id
+                    )
+                )
+                changed_participant_ids.add(participant_id)
+
+        # Bulk changes do not send signals, so all of them are counted at once
+        if ids_to_delete:
+            models.TaskAssignment.delete_all(
+                models.TaskAssignment.objects.filter(id__in=ids_to_delete)
+            )
+        models.TaskAssignment.objects.bulk_update(updated_assignments, ["task"])
+        models.TaskAssignment.objects.bulk_create(new_assignments)
+        models.ProgressCounter.record(
+            changes
+            + [
+                (assignment, None, assignment.get_progress_state())
+                for assignment in new_assignments
+            ]
+        )
+        if changed_participant_ids:
+            models.Participant.touch_assignments(changed_participant_ids)
+
+    @staticmethod
+    def _save_ratings(experiment: models.Experiment, ratings_data: List[dict]):
+        """Create, update and delete the ratings of an experiment in bulk. Ratings
+        are shown in the order they were created, and the editor only adds them at
+        the end, so existing ones are updated in place."""
+        existing_ratings = experiment.ratings.in_bulk()
+        rating_ids = set()
+        new_ratings = []
+        updated_ratings = []
+        for rating_data in ratings_data:
+            rating_id = None
+            if rating_data.get("id") is not None:
+                rating_id = _parse_uuid(rating_data["id"], "rating ID")
+                if rating_id in rating_ids:
+                    raise exceptions.InvalidExperimentData(
+                        f"Duplicate rating ID {rating_data['id']!r}"
+                    )
+                rating_ids.add(rating_id)
+            rating = existing_ratings.get(rating_id)
+            if rating is None:
+                rating = models.TaskRating(experiment=experiment)
+                if rating_id is not None:
+                    rating.id = rating_id
+                new_ratings.append(rating)
+            state = _get_rating_state(rating)
+            rating.question = rating_data["question"]
+            rating.rating_type = rating_data["type"]
+            rating.low_extreme = rating_data["lowExtreme"]
+            rating.high_extreme = rating_data["highExtreme"]
+            if rating_id in existing_ratings and _get_rating_state(rating) != state:
+                updated_ratings.append(rating)
+        # IDs of ratings that are not this experiment's must not be taken over
+        if models.TaskRating.objects.filter(
+            id__in=[rating.id for rating in new_ratings]
+        ).exists():
+            raise exceptions.InvalidExperimentData("Rating ID of another experiment")
+
+        experiment.ratings.exclude(id__in=rating_ids).delete()
+        models.TaskRating.objects.bulk_update(
+            updated_ratings, ["question", "rating_type", "low_extreme", "high_extreme"]
+        )
+        models.TaskRating.objects.bulk_create(new_ratings)
 
     @staticmethod
-    def _get_experiment(experiment_id) -> models.Experiment:
+    def _get_experiment(experiment_id, select_related=()) -> models.Experiment:
         if experiment_id is not None:
             try:
-                return models.Experiment.objects.get(id=experiment_id)
+                return models.Experiment.objects.select_related(*select_related).get(
+                    id=experiment_id
+                )
             except models.Experiment.DoesNotExist:
                 return models.Experiment(id=experiment_id)
         else:
@@ -308,104 +588,142 @@ class ExperimentDetail(View):
         else:
             return models.Task()
 
-    @staticmethod
-    def _get_rating(rating_id) -> models.TaskRating:
-        if rating_id is not None:
-            try:
-                return models.TaskRating.objects.get(id=rating_id)
-            except models.TaskRating.DoesNotExist:
-                return models.TaskRating(id=rating_id)
-        else:
-            return models.TaskRating()
+
+def experiment_assignments(request, experiment_id):
+    """Return a page of participants with their assignments in an experiment, for
+    the assignment matrix of the experiment editor."""
+    paginator = Paginator(
+        models.Participant.objects.order_by("label", "id"),
+        settings.EDITOR_PAGE_SIZE,
+    )
+    page = paginator.get_page(request.GET.get("page"))
+    assignments = {participant.id: [] for participant in page}
+    for participant_id, task_id, started_time in (
+        models.TaskAssignment.objects.filter(
+            task__experiment_id=experiment_id, participant_id__in=assignments
+        )
+        .order_by("id")
+        .values_list("participant_id", "task_id", "started_time")
+    ):
+        assignments[participant_id].append(
+            {"id": str(task_id), "started": started_time is not None}
+        )
+    return JsonResponse(
+        {
+            "participants": [
+                {
+                    "id": str(participant.id),
+                    "label": participant.label,
+                    "assignments": assignments[participant.id],
+                }
+                for participant in page
+            ],
+            "page": page.number,
+            "nPages": paginator.num_pages,
+            "nParticipants": paginator.count,
+        }
+    )
+
+
+def experiment_tasks(request, experiment_id):
+    """Return the data of the tasks of an experiment given as `id` parameters (at
+    most `EDITOR_PAGE_SIZE`), for the experiment editor."""
+    task_ids = request.GET.getlist("id")
+    if len(task_ids) > settings.EDITOR_PAGE_SIZE:
+        return JsonResponse({"message": "Too many tasks"}, status=400)
+    try:
+        task_ids = [uuid.UUID(task_id) for task_id in task_ids]
+    except ValueError:
+        return JsonResponse({"message": "Invalid task ID"}, status=400)
+    tasks = models.Task.objects.filter(
+        experiment_id=experiment_id, id__in=task_ids
+    ).select_related("shared_data")
+    return JsonResponse(
+        {
+            "tasks": [
+                {"id": str(task.id), "label": task.label, "data": task.get_data()}
+                for task in tasks
+            ]
+        }
+    )
 
 
 def experiment_results(request, experiment_id):
     download = "download" in request.GET
+    # Only results finished after this cursor (all if empty), see `export`
+    since = request.GET.get("since")
+    if since is not None:
+        try:
+            export.parse_cursor(since)
+        except ValueError:
+            return JsonResponse({"message": "Invalid cursor"}, status=400)
     experiment = models.Experiment.objects.get(id=experiment_id)
-    data = {
-        "experiment": {
-            "id": experiment.id,
-            "title": experiment.title,
-            "taskType": experiment.task_type,
-        },
-        "results": [
-            {
-                "participant": {
-                    "id": participant.id,
-                    "label": participant.label,
-                },
-                "practiceTasks": [
-                    {
-                        "id": assignment.task.id,
-                        "label": assignment.task.label,
-                        "results": assignment.results,
-                        "startedTime": assignment.started_time,
-                        "finishedTime": assignment.finished_time,
-                    }
-                    for assignment in experiment.get_assignments(
-                        participant, practice=True
-                    )
-                ],
-                "tasks": [
-                    {
-                        "id": assignment.task.id,
-                        "label": assignment.task.label,
-                        "results": assignment.results,
-                        "startedTime": assignment.started_time,
-                        "finishedTime": assignment.finished_time,
-                    }
-                    for assignment in experiment.get_assignments(participant)
-                ],
-            }
-            for participant in models.Participant.objects.all()
-        ],
-    }
-    response = JsonResponse(
-        data,
-        status=200,
+    # The JSON is written to a temporary file before the response starts, since
+    # streaming from the database would run queries in the ASGI event loop
+    file = tempfile.TemporaryFile()
+    export.write_experiment_results(experiment, file, since=since)
+    file.seek(0)
+    return FileResponse(
+        file,
+        as_attachment=download,
+        filename=f"{experiment.id}.json",
+        content_type="application/json",
+    )
+
+
+def experiment_events(request, experiment_id, file_format):
+    if file_format not in export.get_event_file_formats():
+        return HttpResponse("unknown format", status=404)
+    download = "download" in request.GET
+    experiment = models.Experiment.objects.get(id=experiment_id)
+    # Written to a temporary file first, like `experiment_results`
+    file = tempfile.TemporaryFile()
+    export.write_experiment_events(experiment, file, file_format)
+    file.seek(0)
+    return FileResponse(
+        file,
+        as_attachment=download,
+        filename=f"{experiment.id}-events.{file_format}",
+        content_type=export.EVENT_FILE_CONTENT_TYPES[file_format],
     )
-    if download:
-        response["Content-Disposition"] = f"attachment; filename={experiment.id}.json"
-    return response
 
 
 def experiment_results_graph(request, experiment_id, participant_id):
     experiment = models.Experiment.objects.get(id=experiment_id)
     participant = models.Participant.objects.get(id=participant_id)
+    assignments = list(
+        itertools.chain(
+            experiment.get_assignments(participant, practice=True).defer("results"),
+            experiment.get_assignments(participant).defer("results"),
+        )
+    )
 
-    def random_color():
-        return f"#{random.randint(0, 0xFFFFFF):06x}"
+    def load_results(assignment_ids):
+        return {
+            assignment.id: assignment.get_results()
+            for assignment in models.TaskAssignment.objects.filter(
+                id__in=assignment_ids
+            ).select_related("compressed_results")
+        }
 
-    tasks = []
-    label_colors = {}
-    assignments = itertools.chain(
-        experiment.get_assignments(participant, practice=True),
-        experiment.get_assignments(participant),
-    )
-    for assignment in assignments:
-        if assignment.results is not None:
-            results = assignment.results
-            start_timestamp = datetime.fromisoformat(
-                results["events"][0]["time"].replace("Z", "+00:00")
-            ).timestamp()
-            for event in results["events"]:
-                time = datetime.fromisoformat(event["time"].replace("Z", "+00:00"))
-                event["time"] = (time.timestamp() - start_timestamp) * 100
-                event["color"] = label_colors.setdefault(event["label"], random_color())
-            tasks.append(
-                {
-                    "task": str(assignment.task.id)
-                    + (
-                        " (practice)"
-                        if assignment.task == experiment.practice_task
-                        else ""
-                    ),
-                    "results": assignment.results,
-                    "started_time": assignment.started_time,
-                    "finished_time": assignment.finished_time,
-                    "graph_width": results["events"][-1]["time"] + 20,
-                }
-            )
+    # Assignments are loaded without results, which are only needed for
+    # timelines that are not cached yet
+    timelines = timeline.get_timelines(assignments, load_results)
+    tasks = [
+        {
+            "task": str(assignment.task_id)
+            + (
+                " (practice)"
+                if assignment.task_id == experiment.practice_task_id
+                else ""
+            ),
+            "timeline": timelines.get(assignment.id),
+            "started_time": assignment.started_time,
+            "finished_time": assignment.finished_time,
+        }
+        for assignment in assignments
+        if assignment.id in timelines
+    ]
     return render(
         request,
         "okra_server/experiment_results_graph.html",
@@ -444,6 +762,35 @@ def new_participant(request):
     return redirect("participant-list")
 
 
+@require_POST
+def new_participants(request):
+    label_prefix = request.POST.get("label_prefix", "")
+    try:
+        n = int(request.POST["n"])
+    except (KeyError, ValueError):
+        return HttpResponse("invalid number of participants", status=400)
+    if not 1 <= n <= settings.MAX_NEW_PARTICIPANTS:
+        return HttpResponse("invalid number of participants", status=400)
+    if len(label_prefix) + len(str(n)) > 50:
+        return HttpResponse("label prefix too long", status=400)
+    models.Participant.create_batch(n, label_prefix)
+    return redirect(
+        reverse("participant-sheet") + "?" + urlencode({"label_prefix": label_prefix})
+    )
+
+
+def participant_sheet(request):
+    participants = models.Participant.objects.filter(
+        device_key__isnull=True,
+        label__startswith=request.GET.get("label_prefix", ""),
+    )
+    return HttpResponse(
+        qr.render_registration_sheet(
+            _get_base_url(request), participants, settings.QR_CODE_FORMAT
+        )
+    )
+
+
 @require_POST
 def label_participant(request, participant_id):
     new_label = request.POST["label"]
@@ -2,6 +2,7 @@ import pytest
 from django.contrib.auth.models import User
 from django.core.management import call_command
 
+from okra_server.credentials import credential_cache
 from okra_server.models import Participant
 
 
@@ -10,6 +11,12 @@ def database(db):
     pass
 
 
+@pytest.fixture(autouse=True)
+def clear_credential_cache():
+    # Database changes are rolled back after each test without sending signals
+    credential_cache.clear()
+
+
 @pytest.fixture(autouse=True, scope="session")
 def staticfiles():
     call_command("collectstatic", "--noinput")
@@ -1,6 +1,31 @@
+import gzip
+import io
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIRequest
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
 
-from okra_server.models import Experiment, Task, TaskAssignment, TaskType
+from okra_server.api import views as api_views
+from okra_server.credentials import credential_cache
+from okra_server.models import (
+    Experiment,
+    Participant,
+    Task,
+    TaskAssignment,
+    TaskData,
+    TaskRating,
+    TaskType,
+)
 
 
 @pytest.fixture
@@ -74,6 +99,303 @@ def test_experiments(client, registered_participant, experiment):
     assert response.json()["experiments"][0]["hasPracticeTask"] is True
 
 
+def test_credential_cache(client, registered_participant, experiment):
+    def get_experiments(participant_id, device_key):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                "/api/experiments",
+                HTTP_X_PARTICIPANT_ID=participant_id,
+                HTTP_X_DEVICE_KEY=device_key,
+            )
+        return response, len(queries)
+
+    credentials = (str(registered_participant.id), registered_participant.device_key)
+    response, n_queries = get_experiments(*credentials)
+    assert response.status_code == 200, response.content
+    assert credential_cache.stats()["misses"] == 1
+    response, n_queries_cached = get_experiments(*credentials)
+    assert response.status_code == 200, response.content
+    assert credential_cache.stats()["hits"] == 1
+    assert n_queries_cached == n_queries - 1
+
+    response, _ = get_experiments(str(registered_participant.id), "incorrect_key")
+    assert response.status_code == 401, response.content
+
+    registered_participant.unregister()
+    registered_participant.save()
+    response, _ = get_experiments(*credentials)
+    assert response.status_code == 401, response.content
+
+    registered_participant.register()
+    registered_participant.save()
+    credentials = (str(registered_participant.id), registered_participant.device_key)
+    response, _ = get_experiments(*credentials)
+    assert response.status_code == 200, response.content
+    registered_participant.delete()
+    response, _ = get_experiments(*credentials)
+    assert response.status_code == 401, response.content
+
+
+def test_credential_cache_revoked_elsewhere(
+    client, caplog, registered_participant, experiment
+):
+    def get_experiments():
+        return client.get(
+            "/api/experiments",
+            HTTP_X_PARTICIPANT_ID=registered_participant.id,
+            HTTP_X_DEVICE_KEY=registered_participant.device_key,
+        )
+
+    now = time.monotonic()
+    with mock.patch("okra_server.credentials.time.monotonic", return_value=now):
+        assert get_experiments().status_code == 200
+        # Like unregistering in another process, which cannot invalidate this cache
+        Participant.objects.filter(id=registered_participant.id).update(device_key=None)
+        assert get_experiments().status_code == 200
+    expired = now + credential_cache.ttl
+    with mock.patch("okra_server.credentials.time.monotonic", return_value=expired):
+        assert get_experiments().status_code == 401
+    assert credential_cache.stats()["hits"] == 1
+    assert credential_cache.stats()["misses"] == 2
+
+    with mock.patch.object(credential_cache, "stats_interval", 1), caplog.at_level(
+        logging.INFO, logger="okra_server.credentials"
+    ):
+        credential_cache.get(str(registered_participant.id), "key")
+    assert "'misses': 3" in caplog.text
+
+
+def test_experiments_query_count(client, registered_participant, experiment):
+    def get_experiments():
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                "/api/experiments",
+                HTTP_X_PARTICIPANT_ID=registered_participant.id,
+                HTTP_X_DEVICE_KEY=registered_participant.device_key,
+            )
+        assert response.status_code == 200, response.content
+        return response.json()["experiments"], len(queries)
+
+    get_experiments()  # Populate credential cache
+    experiments, n_queries = get_experiments()
+    assert len(experiments) == 1
+
+    for i in range(5):
+        e = Experiment.objects.create(
+            task_type=TaskType.QUESTION_ANSWERING,
+            title=f"Dependent experiment {i}",
+            instructions="",
+            visible=True,
+        )
+        e.required_experiments.add(experiment)
+        TaskRating.objects.create(
+            experiment=e,
+            question="Rating",
+            rating_type="slider",
+        )
+        for _ in range(2):
+            TaskAssignment.objects.create(
+                participant=registered_participant,
+                task=Task.objects.create(experiment=e, data={}),
+            )
+
+    # Dependent experiments are unavailable until the required one is done
+    experiments, n_queries_more = get_experiments()
+    assert len(experiments) == 1
+    assert n_queries_more == n_queries
+
+    experiment.start_task(registered_participant)
+    experiments, n_queries_more = get_experiments()
+    assert len(experiments) == 6
+    assert n_queries_more == n_queries
+    for e in experiments:
+        if e["id"] == str(experiment.id):
+            continue
+        assert e["nTasks"] == 2
+        assert e["nTasksDone"] == 0
+        assert len(e["ratings"]) == 1
+
+
+def test_finish_unstarted_required_task(client, registered_participant, experiment):
+    dependent = Experiment.objects.create(
+        task_type=TaskType.QUESTION_ANSWERING,
+        title="Dependent experiment",
+        instructions="",
+        visible=True,
+    )
+    dependent.required_experiments.add(experiment)
+    TaskAssignment.objects.create(
+        participant=registered_participant,
+        task=Task.objects.create(experiment=dependent, data={}),
+    )
+    headers = {
+        "HTTP_X_PARTICIPANT_ID": registered_participant.id,
+        "HTTP_X_DEVICE_KEY": registered_participant.device_key,
+    }
+    response = client.get(f"/api/experiments/{dependent.id}", **headers)
+    assert response.status_code == 404
+
+    # Finishing a task without starting it first (e.g. from an offline bundle)
+    experiment.tasks.get().finish(registered_participant, {})
+    assert experiment.get_n_tasks(
+        registered_participant, started=True
+    ) == experiment.get_n_tasks(registered_participant)
+
+    response = client.get("/api/experiments", **headers)
+    assert response.status_code == 200, response.content
+    assert str(dependent.id) in [e["id"] for e in response.json()["experiments"]]
+    response = client.get(f"/api/experiments/{dependent.id}", **headers)
+    assert response.status_code == 200, response.content
+    response = client.post(
+        f"/api/experiments/{dependent.id}/start",
+        content_type="application/json",
+        **headers,
+    )
+    assert response.status_code == 200, response.content
+
+
+def test_experiments_etag(client, registered_participant, experiment):
+    def get(url, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag is not None else {}
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(
+                url,
+                HTTP_X_PARTICIPANT_ID=registered_participant.id,
+                HTTP_X_DEVICE_KEY=registered_participant.device_key,
+                **headers,
+            )
+        return response, len(queries)
+
+    for url in [
+        "/api/experiments",
+        f"/api/experiments/{experiment.id}",
+        f"/api/experiments/{experiment.id}/bundle",
+    ]:
+        response, n_queries = get(url)
+        assert response.status_code == 200, response.content
+        etag = response["ETag"]
+
+        response, n_queries_not_modified = get(url, etag)
+        assert response.status_code == 304, response.content
+        assert response["ETag"] == etag
+        assert n_queries_not_modified < n_queries
+
+        experiment.title = "New title"
+        experiment.save()
+        response, _ = get(url, etag)
+        assert response.status_code == 200, response.content
+        assert response["ETag"] != etag
+        etag = response["ETag"]
+
+        task = experiment.start_task(registered_participant)
+        task.cancel(registered_participant)
+        response, _ = get(url, etag)
+        assert response.status_code == 200, response.content
+        assert response["ETag"] != etag
+        etag = response["ETag"]
+
+        response, _ = get(url, etag)
+        assert response.status_code == 304, response.content
+
+        TaskAssignment.objects.create(
+            participant=registered_participant,
+            task=Task.objects.create(experiment=experiment, data={}),
+        )
+
+
+def test_experiment_bundle_etag(client, registered_participant, experiment):
+    url = f"/api/experiments/{experiment.id}/bundle"
+
+    def get(query="", etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag is not None else {}
+        return client.get(
+            url + query,
+            HTTP_X_PARTICIPANT_ID=registered_participant.id,
+            HTTP_X_DEVICE_KEY=registered_participant.device_key,
+            **headers,
+        )
+
+    etag = get()["ETag"]
+    assert get(etag=etag).status_code == 304
+    # Including data by reference is a different representation
+    response = get("?dataReference=true", etag)
+    assert response.status_code == 200, response.content
+    assert response["ETag"] != etag
+
+    # Task data can change without a new experiment version
+    for task in [
+        experiment.practice_task,
+        experiment.get_assignments(registered_participant).get().task,
+    ]:
+        task.set_data({"changed": "data"})
+        task.save()
+        response = get(etag=etag)
+        assert response.status_code == 200, response.content
+        assert response["ETag"] != etag
+        etag = response["ETag"]
+    assert response.json()["tasks"][0]["data"] == {"changed": "data"}
+
+
+@pytest.mark.parametrize("backend", ["django", "orjson"])
+def test_json_backend(client, settings, registered_participant, experiment, backend):
+    settings.JSON_BACKEND = backend
+    response = client.get(
+        "/api/experiments",
+        HTTP_X_PARTICIPANT_ID=registered_participant.id,
+        HTTP_X_DEVICE_KEY=registered_participant.device_key,
+    )
+    assert response.status_code == 200, response.content
+    assert response.json()["experiments"][0]["id"] == str(experiment.id)
+
+
+def test_json_compression(client, settings, registered_participant, experiment):
+    for _ in range(10):
+        TaskRating.objects.create(
+            experiment=experiment,
+            question="How difficult was the task?",
+            rating_type="slider",
+        )
+
+    def get_experiments():
+        return client.get(
+            "/api/experiments",
+            HTTP_X_PARTICIPANT_ID=registered_participant.id,
+            HTTP_X_DEVICE_KEY=registered_participant.device_key,
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+
+    response = get_experiments()
+    assert response.status_code == 200, response.content
+    assert not response.has_header("Content-Encoding")
+
+    settings.JSON_RESPONSE_COMPRESSION = True
+    response = get_experiments()
+    assert response.status_code == 200, response.content
+    assert response["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.content))["experiments"]
+
+
+def test_async_client(async_client, registered_participant, experiment):
+    headers = {
+        "X-Participant-ID": str(registered_participant.id),
+        "X-Device-Key": registered_participant.device_key,
+    }
+    response = async_to_sync(async_client.get)("/api/experiments", **headers)
+    assert response.status_code == 200, response.content
+    assert response.json()["experiments"][0]["id"] == str(experiment.id)
+
+    response = async_to_sync(async_client.post)(
+        f"/api/experiments/{experiment.id}/start",
+        content_type="application/json",
+        **headers,
+    )
+    assert response.status_code == 200, response.content
+    assert experiment.get_n_tasks(registered_participant, started=True) == 1
+
+    response = async_to_sync(async_client.post)("/api/experiments", **headers)
+    assert response.status_code == 405, response.content
+
+
 def test_start_finish_task(client, registered_participant, experiment):
     assignment = registered_participant.assignments.get()
     assert assignment.started_time is None
@@ -114,6 +436,369 @@ def test_start_finish_task(client, registered_participant, experiment):
     assert experiment.get_n_tasks(registered_participant, started=True) == 1
 
 
+def test_finish_task_idempotency_key(
+    client, settings, registered_participant, experiment
+):
+    task = experiment.start_task(registered_participant)
+    results = {"data": {"dummy_key": "dummy_value"}, "events": []}
+
+    def finish(key, path=f"/api/tasks/{task.id}/finish"):
+        return client.post(
+            path,
+            results,
+            content_type="application/json",
+            HTTP_X_PARTICIPANT_ID=registered_participant.id,
+            HTTP_X_DEVICE_KEY=registered_participant.device_key,
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    response = finish("key1")
+    assert response.status_code == 200, response.content
+    assert "Idempotent-Replayed" not in response
+    finished_time = registered_participant.assignments.get().finished_time
+
+    # Retries are answered with the stored response without finishing again
+    with CaptureQueriesContext(connection) as queries:
+        response = finish("key1")
+    assert response.status_code == 200, response.content
+    assert response.json() == {}
+    assert response["Idempotent-Replayed"] == "true"
+    assert not any("okra_server_taskassignment" in q["sql"] for q in queries)
+    assert registered_participant.assignments.get().finished_time == finished_time
+
+    # Without a stored response, the task is already finished
+    assert finish("key2").status_code == 404
+    assert finish("key1", "/api/tasks/finish").status_code == 422
+
+    settings.API_IDEMPOTENCY_KEY_TTL = 0
+    assert finish("key1").status_code == 404
+    call_command("clearidempotencykeys")
+    assert not registered_participant.idempotency_keys.exists()
+
+
+def test_finish_tasks(client, registered_participant, experiment):
+    tasks = [experiment.start_task(registered_participant)]
+    for _ in range(2):
+        task = Task.objects.create(experiment=experiment, data={})
+        TaskAssignment.objects.create(participant=registered_participant, task=task)
+        tasks.append(task)
+
+    results = [
+        {
+            "data": {"dummy_key": f"dummy_value_{i}"},
+            "events": [{"time": "dummy_time", "label": "dummy_label", "data": None}],
+        }
+        for i in range(len(tasks))
+    ]
+    response = client.post(
+        "/api/tasks/finish",
+        {
+            "tasks": [
+                *(
+                    {"id": str(task.id), "results": task_results}
+                    for task, task_results in zip(tasks, results)
+                ),
+                {"id": str(tasks[0].id), "results": None},
+                {"id": "invalid_id", "results": None},
+            ],
+        },
+        content_type="application/json",
+        HTTP_X_PARTICIPANT_ID=registered_participant.id,
+        HTTP_X_DEVICE_KEY=registered_participant.device_key,
+    )
+    assert response.status_code == 200, response.content
+    assert [task["status"] for task in response.json()["tasks"]] == [
+        200,
+        200,
+        200,
+        404,
+        404,
+    ]
+    for task, task_results in zip(tasks, results):
+        assignment = registered_participant.assignments.get(task=task)
+        assert assignment.finished_time is not None
+        assert assignment.results == task_results
+
+    for body in [[], '"tasks"']:
+        response = client.post(
+            "/api/tasks/finish",
+            body,
+            content_type="application/json",
+            HTTP_X_PARTICIPANT_ID=registered_participant.id,
+            HTTP_X_DEVICE_KEY=registered_participant.device_key,
+        )
+        assert response.status_code == 400, response.content
+
+    response = client.post(
+        "/api/tasks/finish",
+        {"tasks": [{"results": None}]},
+        content_type="application/json",
+        HTTP_X_PARTICIPANT_ID=registered_participant.id,
+        HTTP_X_DEVICE_KEY=registered_participant.device_key,
+    )
+    assert response.status_code == 400, response.content
+
+
+def test_experiment_bundle(client, registered_participant, experiment):
+    experiment.instructions_after_final_task = "You've completed the final task."
+    experiment.save()
+    final_task = Task.objects.create(experiment=experiment, data={"final": "task"})
+    TaskAssignment.objects.create(participant=registered_participant, task=final_task)
+
+    response = client.get(
+        f"/api/experiments/{experiment.id}/bundle",
+        HTTP_X_PARTICIPANT_ID=registered_participant.id,
+        HTTP_X_DEVICE_KEY=registered_participant.device_key,
+    )
+    assert response.status_code == 200, response.content
+    bundle = response.json()
+    assert bundle["version"] == 1
+    assert bundle["experiment"]["id"] == str(experiment.id)
+    assert bundle["experiment"]["nTasks"] == 2
+    assert bundle["practiceTask"]["id"] == str(experiment.practice_task.id)
+    assert (
+        bundle["practiceTask"]["instructionsAfter"]
+        == "You've completed the practice task."
+    )
+    assert [task["id"] for task in bundle["tasks"]] == [
+        str(assignment.task.id)
+        for assignment in experiment.get_assignments(registered_participant)
+    ]
+    assert bundle["tasks"][0]["instructionsAfter"] == "You've completed the task."
+    assert bundle["tasks"][1]["instructionsAfter"] == "You've completed the final task."
+    assert bundle["tasks"][1]["data"] == {"final": "task"}
+
+    # The practice task is assigned when it is finished
+    response = client.post(
+        "/api/tasks/finish",
+        {
+            "tasks": [
+                {"id": task["id"], "results": {}}
+                for task in [bundle["practiceTask"], *bundle["tasks"]]
+            ]
+        },
+        content_type="application/json",
+        HTTP_X_PARTICIPANT_ID=registered_participant.id,
+        HTTP_X_DEVICE_KEY=registered_participant.device_key,
+    )
+    assert response.status_code == 200, response.content
+    assert [task["status"] for task in response.json()["tasks"]] == [200] * 3
+    assert experiment.get_n_tasks(registered_participant, started=True) == 2
+    assert experiment.get_n_tasks(registered_participant, finished=True) == 2
+    assert (
+        experiment.get_n_tasks(registered_participant, practice=True, finished=True)
+        == 1
+    )
+    assert (
+        experiment.get_assignments(registered_participant, practice=True)
+        .get()
+        .get_results()
+        == {}
+    )
+
+    response = client.get(
+        f"/api/experiments/{experiment.id}/bundle",
+        HTTP_X_PARTICIPANT_ID=registered_participant.id,
+        HTTP_X_DEVICE_KEY=registered_participant.device_key,
+    )
+    assert response.status_code == 200, response.content
+    assert response.json()["tasks"] == []
+
+
+def test_task_data_reference(
+    client, settings, tmp_path, registered_participant, experiment
+):
+    settings.TASK_DATA_ROOT = str(tmp_path)
+    settings.TASK_DATA_ACCEL_REDIRECT_URL = ""
+    headers = {
+        "HTTP_X_PARTICIPANT_ID": registered_participant.id,
+        "HTTP_X_DEVICE_KEY": registered_participant.device_key,
+    }
+    task = experiment.get_assignments(registered_participant).get().task
+
+    response = client.post(
+        f"/api/experiments/{experiment.id}/start?dataReference=true",
+        content_type="application/json",
+        **headers,
+    )
+    assert response.status_code == 200, response.content
+    assert "data" not in response.json()
+    data_hash = response.json()["dataHash"]
+    assert data_hash == TaskData.hash_data(task.data)
+    assert (tmp_path / data_hash[:2] / f"{data_hash}.json").is_file()
+
+    response = client.get(f"/api/task-data/{data_hash}", **headers)
+    assert response.status_code == 200
+    assert json.loads(b"".join(response.streaming_content)) == task.data
+    assert response["Cache-Control"] == "private, max-age=31536000, immutable"
+
+    settings.TASK_DATA_ACCEL_REDIRECT_URL = "/protected/task-data/"
+    response = client.get(f"/api/task-data/{data_hash}", **headers)
+    assert response.status_code == 200
+    assert response.content == b""
+    assert (
+        response["X-Accel-Redirect"]
+        == f"/protected/task-data/{data_hash[:2]}/{data_hash}.json"
+    )
+
+    assert client.get("/api/task-data/0123", **headers).status_code == 404
+    assert client.get(f"/api/task-data/{'0' * 64}", **headers).status_code == 404
+    response = client.get(f"/api/task-data/{data_hash}")
+    assert response.status_code == 400
+
+    response = client.get(
+        f"/api/experiments/{experiment.id}/bundle?dataReference=true", **headers
+    )
+    assert response.status_code == 200, response.content
+    practice_task = response.json()["practiceTask"]
+    assert practice_task["dataHash"] == TaskData.hash_data({"practice": "task"})
+
+    # References are only used if task data files are enabled
+    settings.TASK_DATA_ROOT = None
+    response = client.get(
+        f"/api/experiments/{experiment.id}/bundle?dataReference=true", **headers
+    )
+    assert response.json()["practiceTask"]["data"] == {"practice": "task"}
+    assert client.get(f"/api/task-data/{data_hash}", **headers).status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_start_task_concurrent(registered_participant, experiment):
+    for _ in range(9):
+        TaskAssignment.objects.create(
+            participant=registered_participant,
+            task=Task.objects.create(experiment=experiment, data={}),
+        )
+
+    def start_task(_):
+        try:
+            response = Client().post(
+                f"/api/experiments/{experiment.id}/start",
+                content_type="application/json",
+                HTTP_X_PARTICIPANT_ID=registered_participant.id,
+                HTTP_X_DEVICE_KEY=registered_participant.device_key,
+            )
+            return response.status_code, response.json().get("id")
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(start_task, range(12)))
+
+    started_task_ids = [task_id for status, task_id in responses if status == 200]
+    assert len(started_task_ids) == 10
+    assert len(set(started_task_ids)) == 10
+    assert [status for status, _ in responses].count(404) == 2
+    for assignment in registered_participant.assignments.all():
+        assert assignment.started_time is not None
+    # Every start cancels the previously started task
+    assert registered_participant.assignments.filter(canceled=True).count() == 10
+
+
+@pytest.mark.django_db(transaction=True)
+def test_start_task_double_tap(registered_participant, experiment):
+    for _ in range(4):
+        TaskAssignment.objects.create(
+            participant=registered_participant,
+            task=Task.objects.create(experiment=experiment, data={}),
+        )
+    barrier = threading.Barrier(2)
+
+    def start_task(_):
+        try:
+            barrier.wait()
+            return experiment.start_task(registered_participant).id
+        finally:
+            connection.close()
+
+    for _ in range(2):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            task_ids = list(executor.map(start_task, range(2)))
+        assert len(set(task_ids)) == 2
+        # Only the task started last is left unfinished
+        assert (
+            registered_participant.assignments.filter(
+                started_time__isnull=False, finished_time__isnull=True
+            ).count()
+            == 1
+        )
+
+
+def test_finish_task_body_size(client, settings, registered_participant, experiment):
+    settings.API_MAX_BODY_SIZES = {"finish_task": 1000}
+    task = experiment.start_task(registered_participant)
+
+    results = {
+        "data": None,
+        "events": [
+            {"time": "dummy_time", "label": "dummy_label", "data": None}
+            for _ in range(100)
+        ],
+    }
+    response = client.post(
+        f"/api/tasks/{task.id}/finish",
+        results,
+        content_type="application/json",
+        HTTP_X_PARTICIPANT_ID=registered_participant.id,
+        HTTP_X_DEVICE_KEY=registered_participant.device_key,
+    )
+    assert response.status_code == 413, response.content
+    assert response.json()["error"] == "Request body too large"
+    assert experiment.get_n_tasks(registered_participant, finished=True) == 0
+
+    results["events"] = results["events"][:1]
+    response = client.post(
+        f"/api/tasks/{task.id}/finish",
+        results,
+        content_type="application/json",
+        HTTP_X_PARTICIPANT_ID=registered_participant.id,
+        HTTP_X_DEVICE_KEY=registered_participant.device_key,
+    )
+    assert response.status_code == 200, response.content
+    assert registered_participant.assignments.get(task=task).results == results
+
+    response = client.post(
+        f"/api/tasks/{task.id}/finish",
+        "{invalid",
+        content_type="application/json",
+        HTTP_X_PARTICIPANT_ID=registered_participant.id,
+        HTTP_X_DEVICE_KEY=registered_participant.device_key,
+    )
+    assert response.status_code == 400, response.content
+
+
+def test_finish_task_chunked_body(settings, registered_participant, experiment):
+    settings.API_MAX_BODY_SIZES = {"finish_task": 1000}
+    task = experiment.start_task(registered_participant)
+
+    def finish(body):
+        # Like a chunked request under ASGI, without a Content-Length header
+        request = ASGIRequest(
+            {
+                "type": "http",
+                "method": "POST",
+                "path": f"/api/tasks/{task.id}/finish",
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"x-participant-id", str(registered_participant.id).encode()),
+                    (b"x-device-key", registered_participant.device_key.encode()),
+                ],
+            },
+            io.BytesIO(body),
+        )
+        return async_to_sync(api_views.finish_task)(request, task_id=str(task.id))
+
+    results = {"data": None, "events": [{"time": "dummy_time", "data": "x" * 1000}]}
+    response = finish(json.dumps(results).encode())
+    assert response.status_code == 413, response.content
+    assert experiment.get_n_tasks(registered_participant, finished=True) == 0
+
+    results["events"][0]["data"] = "x"
+    response = finish(json.dumps(results).encode())
+    assert response.status_code == 200, response.content
+    assert registered_participant.assignments.get(task=task).results == results
+
+
 def test_start_restart_task(client, registered_participant, experiment):
     assignment = registered_participant.assignments.get()
     assert assignment.started_time is None
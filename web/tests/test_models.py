@@ -1,7 +1,18 @@
+import json
+
 import pytest
+from django.core.management import call_command
+from django.db.models import F
 
-from okra_server.exceptions import NoTasksAvailable
-from okra_server.models import Experiment, Task, TaskAssignment, TaskType
+from okra_server.exceptions import CyclicRequirements, NoTasksAvailable
+from okra_server.models import (
+    Experiment,
+    ProgressCounter,
+    Task,
+    TaskAssignment,
+    TaskAssignmentResults,
+    TaskType,
+)
 
 
 @pytest.fixture
@@ -220,3 +231,188 @@ def test_experiment_is_available_requirements(registered_participant, experiment
     # Required experiment completed
     assert experiment.is_available(registered_participant) is True
     assert required_experiment.is_available(registered_participant) is True
+
+
+def test_experiment_requirements_cycle(experiment):
+    e1 = Experiment.objects.create(visible=True)
+    e2 = Experiment.objects.create(visible=True)
+    e1.set_required_experiments([experiment.id])
+    e2.set_required_experiments([e1.id, experiment.id])
+    for e in [experiment, e1, e2]:
+        e.refresh_from_db()
+    assert [experiment.requirement_level, e1.requirement_level] == [0, 1]
+    assert e2.requirement_level == 2
+
+    with pytest.raises(CyclicRequirements):
+        experiment.set_required_experiments([e2.id])
+    with pytest.raises(CyclicRequirements):
+        experiment.set_required_experiments([experiment.id])
+    assert experiment.required_experiments.count() == 0
+
+    e2.set_required_experiments([experiment.id])
+    e2.refresh_from_db()
+    assert e2.requirement_level == 1
+    e1.set_required_experiments([])
+    experiment.set_required_experiments([e1.id])
+    for e in [experiment, e1, e2]:
+        e.refresh_from_db()
+    assert [e1.requirement_level, experiment.requirement_level] == [0, 1]
+    assert e2.requirement_level == 2
+
+
+def test_compressed_results(settings, registered_participant, experiment):
+    settings.RESULTS_STORAGE = "compressed"
+    results = {"data": {"answers": [1, 2]}, "events": [{"label": "start"}]}
+    task = experiment.start_task(registered_participant)
+    task.finish(registered_participant, results)
+    assignment = TaskAssignment.objects.get(task=task)
+    assert assignment.results is None
+    assert assignment.compressed_results.codec in ["gzip", "zstd"]
+    assert assignment.get_results() == results
+
+    task = experiment.start_task(registered_participant)
+    registered_participant.finish_tasks({task.id: results})
+    assignment = TaskAssignment.objects.select_related("compressed_results").get(
+        task=task
+    )
+    assert assignment.results is None
+    assert assignment.get_results() == results
+
+    settings.RESULTS_STORAGE = "inline"
+    call_command("moveresults")
+    assert not TaskAssignmentResults.objects.exists()
+    assert [assignment.results for assignment in TaskAssignment.objects.all()] == [
+        results,
+        results,
+    ]
+    settings.RESULTS_STORAGE = "compressed"
+    call_command("moveresults", "--batch-size", "1")
+    assert TaskAssignmentResults.objects.count() == 2
+    assert not TaskAssignment.objects.filter(results__isnull=False).exists()
+    assert [
+        assignment.get_results() for assignment in TaskAssignment.objects.all()
+    ] == [results, results]
+
+
+def test_experiment_progress(
+    registered_participant, unregistered_participant, experiment
+):
+    task = experiment.start_task(registered_participant)
+    task.finish(registered_participant, {})
+    experiment.start_task(registered_participant)
+    practice_task = experiment.start_task(registered_participant, practice=True)
+    practice_task.finish(registered_participant, {})
+    other_experiment = Experiment.objects.create(task_type=TaskType.CLOZE)
+    TaskAssignment.objects.create(
+        participant=unregistered_participant,
+        task=Task.objects.create(experiment=other_experiment, data={}),
+    )
+
+    participants = list(experiment.get_progress())
+    assert participants == [registered_participant]
+    progress = participants[0]
+    assert progress.n_tasks == experiment.get_n_tasks(registered_participant)
+    for attr, kwargs in [
+        ("n_tasks_unfinished", {"finished": False, "canceled": False}),
+        ("n_tasks_finished", {"finished": True, "canceled": False}),
+        ("n_tasks_canceled", {"finished": True, "canceled": True}),
+    ]:
+        assert getattr(progress, attr) == experiment.get_n_tasks(
+            registered_participant, started=True, **kwargs
+        )
+    assert progress.n_practice_tasks_finished == 1
+
+
+def _count_progress(experiment, participant, practice=False):
+    assignments = experiment.get_assignments(participant, practice=practice)
+    return {
+        "n_assigned": assignments.count(),
+        "n_started": assignments.filter(started_time__isnull=False).count(),
+        "n_finished": assignments.filter(finished_time__isnull=False).count(),
+        "n_canceled": assignments.filter(canceled=True).count(),
+    }
+
+
+def _get_counter(experiment, participant, practice=False):
+    counter = ProgressCounter.objects.get(
+        experiment=experiment, participant=participant, practice=practice
+    )
+    return {
+        "n_assigned": counter.n_assigned,
+        "n_started": counter.n_started,
+        "n_finished": counter.n_finished,
+        "n_canceled": counter.n_canceled,
+    }
+
+
+def test_progress_counters(registered_participant, experiment):
+    def check():
+        for practice in [False, True]:
+            assert _get_counter(
+                experiment, registered_participant, practice
+            ) == _count_progress(experiment, registered_participant, practice)
+
+    assert _get_counter(experiment, registered_participant)["n_assigned"] == 2
+    task = experiment.start_task(registered_participant)
+    # Starting the practice task cancels the first task
+    experiment.start_task(registered_participant, practice=True).finish(
+        registered_participant, {}
+    )
+    check()
+    task = experiment.start_task(registered_participant)
+    registered_participant.finish_tasks({task.id: {}})
+    experiment.start_task(registered_participant, practice=True)
+    check()
+    assert experiment.get_n_tasks(registered_participant, practice=True) == 2
+    assert (
+        experiment.get_n_tasks(registered_participant, practice=True, finished=False)
+        == 1
+    )
+
+    deleted_assignments = registered_participant.assignments.filter(task=task)
+    ProgressCounter.record_deleted(deleted_assignments)
+    deleted_assignments.delete()
+    check()
+    assert _get_counter(experiment, registered_participant) == {
+        "n_assigned": 1,
+        "n_started": 1,
+        "n_finished": 1,
+        "n_canceled": 1,
+    }
+
+
+def test_rebuild_progress_counters(registered_participant, experiment):
+    task = experiment.start_task(registered_participant)
+    task.finish(registered_participant, {})
+    experiment.start_task(registered_participant)
+    # Changes bypassing the lifecycle methods are not counted
+    registered_participant.assignments.update(
+        finished_time=F("started_time"), canceled=True
+    )
+    ProgressCounter.objects.update(n_started=0)
+
+    call_command("rebuildprogress", str(experiment.id))
+    expected = _count_progress(experiment, registered_participant)
+    assert expected["n_canceled"] == 2
+    assert _get_counter(experiment, registered_participant) == expected
+    assert ProgressCounter.objects.count() == 1
+
+
+def test_dump_assignments_since(settings, capsys, registered_participant, experiment):
+    settings.RESULTS_EXPORT_SETTLE_TIME = 0
+    task = experiment.start_task(registered_participant)
+    task.finish(registered_participant, {"events": []})
+
+    call_command("dumpassignments", "--since", "")
+    out, cursor = capsys.readouterr()
+    assert [json.loads(line)["taskId"] for line in out.splitlines()] == [str(task.id)]
+    call_command("dumpassignments", "--since", cursor.strip())
+    out, next_cursor = capsys.readouterr()
+    assert out == ""
+    assert next_cursor == cursor
+
+    task = experiment.start_task(registered_participant)
+    task.cancel(registered_participant)
+    call_command("dumpassignments", "--since", cursor.strip())
+    out, _ = capsys.readouterr()
+    assert [json.loads(line)["taskId"] for line in out.splitlines()] == [str(task.id)]
@@ -1,9 +1,20 @@
+import csv
+import io
+import json
+import re
+from unittest import mock
 from uuid import uuid4
 
 import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.functions import Lower
 from django.template.defaultfilters import escapejs
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import set_script_prefix
 
-from okra_server import models
+from okra_server import export, models, qr, timeline
 
 
 @pytest.fixture
@@ -70,9 +81,12 @@ def staff_urls(experiments, registered_participant):
     return [
         "/experiments/new",
         f"/experiments/{experiments[0].id}",
+        f"/experiments/{experiments[0].id}/assignments",
+        f"/experiments/{experiments[0].id}/tasks",
         f"/experiments/{experiments[0].id}/results",
         f"/experiments/{experiments[0].id}/results?download",
         f"/experiments/{experiments[0].id}/results/{registered_participant.id}/graph",
+        "/participants/sheet",
     ]
 
 
@@ -83,6 +97,37 @@ def test_get_registration_detail(authenticated_client, unregistered_participant)
     assert unregistered_participant.registration_key in response.content.decode()
 
 
+def test_get_registration_qr_code(
+    authenticated_client, settings, unregistered_participant
+):
+    for image_format, content_type in [("svg", "image/svg+xml"), ("png", "image/png")]:
+        settings.QR_CODE_FORMAT = image_format
+        response = authenticated_client.get(
+            f"/registration/{unregistered_participant.id}"
+        )
+        qr_url = re.search(r'<img src="([^"]+)"', response.content.decode()).group(1)
+        assert f"/qr.{image_format}?v=" in qr_url
+
+        with mock.patch("okra_server.qr.render_qr_code", wraps=qr.render_qr_code) as m:
+            for _ in range(2):
+                response = authenticated_client.get(qr_url.replace("&amp;", "&"))
+                assert response.status_code == 200, response.content
+                assert response["Content-Type"] == content_type
+                assert "immutable" in response["Cache-Control"]
+            assert m.call_count <= 1
+
+    # A new registration key results in a new image URL
+    unregistered_participant.unregister()
+    unregistered_participant.save()
+    response = authenticated_client.get(f"/registration/{unregistered_participant.id}")
+    assert qr_url not in response.content.decode()
+
+    response = authenticated_client.get(
+        f"/registration/{unregistered_participant.id}/qr.gif"
+    )
+    assert response.status_code == 404
+
+
 def test_get_registration_detail_already_registered(
     authenticated_client, registered_participant
 ):
@@ -154,8 +199,304 @@ def test_get_progress_authenticated(
     assert response.status_code == 200, response.content
     assert str(experiments[0].id) in response.content.decode()
     assert (
-        response.content.decode().count(str(registered_participant.id)) == 2
-    )  # Two occurrences: once as a heading, once as a button
+        response.content.decode().count(str(registered_participant.id)) == 3
+    )  # Three occurrences: as a heading, as a button, and for live updates
+
+
+def test_get_progress_paginated(settings, staff_authenticated_client, experiments):
+    settings.PROGRESS_PAGE_SIZE = 2
+    task = experiments[0].tasks.get()
+    for participant in models.Participant.create_batch(5, "group-"):
+        models.TaskAssignment.objects.create(participant=participant, task=task)
+    models.Participant.create_batch(3, "unassigned-")
+
+    with CaptureQueriesContext(connection) as queries:
+        response = staff_authenticated_client.get(f"/progress/{experiments[0].id}")
+    assert response.status_code == 200, response.content
+    n_queries = len(queries)
+    assert "Page 1 of 3" in response.content.decode()
+
+    response = staff_authenticated_client.get(
+        f"/progress/{experiments[0].id}?label=group&page=3"
+    )
+    assert response.status_code == 200, response.content
+    assert "group-5" in response.content.decode()
+    assert "group-1" not in response.content.decode()
+    assert "Page 3 of 3" in response.content.decode()
+
+    settings.PROGRESS_PAGE_SIZE = 50
+    with CaptureQueriesContext(connection) as queries:
+        response = staff_authenticated_client.get(f"/progress/{experiments[0].id}")
+    assert len(queries) == n_queries
+    content = response.content.decode()
+    assert all(f"group-{i}" in content for i in range(1, 6))
+    assert "unassigned-" not in content
+
+
+@pytest.mark.django_db(transaction=True)
+def test_get_progress_updates(
+    settings, authenticated_client, experiments, registered_participant
+):
+    settings.PROGRESS_POLL_TIMEOUT = 0
+    experiment = experiments[0]
+    url = f"/progress/{experiment.id}/updates"
+    response = authenticated_client.get(f"/progress/{experiment.id}")
+    cursor = int(re.search(r"var cursor = (\d+);", response.content.decode()).group(1))
+
+    response = authenticated_client.get(url, {"since": cursor})
+    assert response.status_code == 200, response.content
+    assert response.json() == {"cursor": cursor, "participants": []}
+
+    task = experiment.start_task(registered_participant)
+    task.finish(registered_participant, {})
+    registered_participant.refresh_from_db()
+    assert (
+        registered_participant.assignments_sequence
+        == models.AssignmentsSequence.current()
+        == cursor + 2
+    )
+    response = authenticated_client.get(url, {"since": cursor})
+    assert response.status_code == 200, response.content
+    assert response.json()["cursor"] == cursor + 2
+    [participant] = response.json()["participants"]
+    assert participant["id"] == str(registered_participant.id)
+    assert participant["n_tasks_finished"] == 1
+    assert participant["percent_tasks_finished"] == 100
+
+    response = authenticated_client.get(url, {"since": response.json()["cursor"]})
+    assert response.json()["participants"] == []
+
+    for since in ["", "now", "-1", "2021-01-01T00:00:00+00:00"]:
+        assert authenticated_client.get(url, {"since": since}).status_code == 400
+    assert Client().get(url, {"since": cursor}).status_code == 302
+
+
+def test_get_experiment_results(
+    staff_authenticated_client, experiments, registered_participant
+):
+    experiment = experiments[0]
+    experiment.start_task(registered_participant, practice=True).finish(
+        registered_participant, {"practice": "results"}
+    )
+    experiment.start_task(registered_participant).finish(
+        registered_participant, {"events": []}
+    )
+    unassigned_participant = models.Participant.objects.create(label="unassigned")
+
+    with CaptureQueriesContext(connection) as queries:
+        response = staff_authenticated_client.get(
+            f"/experiments/{experiment.id}/results?download"
+        )
+        data = json.loads(b"".join(response.streaming_content))
+    assert response.status_code == 200
+    assert response["Content-Disposition"] == (
+        f'attachment; filename="{experiment.id}.json"'
+    )
+    assert data["experiment"]["id"] == str(experiment.id)
+    results = {result["participant"]["id"]: result for result in data["results"]}
+    assert results[str(unassigned_participant.id)]["tasks"] == []
+    result = results[str(registered_participant.id)]
+    assert [task["results"] for task in result["practiceTasks"]] == [
+        {"practice": "results"}
+    ]
+    assert [task["results"] for task in result["tasks"]] == [{"events": []}]
+    assert result["tasks"][0]["finishedTime"] is not None
+
+    # The number of queries does not depend on the number of participants
+    for i in range(3):
+        participant = models.Participant.objects.create(label=f"group-{i}")
+        task = models.Task.objects.create(experiment=experiment, data={})
+        models.TaskAssignment.objects.create(participant=participant, task=task)
+    with CaptureQueriesContext(connection) as more_queries:
+        response = staff_authenticated_client.get(
+            f"/experiments/{experiment.id}/results"
+        )
+        data = json.loads(b"".join(response.streaming_content))
+    assert len(data["results"]) == 5
+    assert len(more_queries) == len(queries)
+
+
+def test_get_experiment_results_merge(staff_authenticated_client, experiments):
+    experiment = experiments[0]
+    task = experiment.tasks.first()
+    labels = ["a", "B", "c", "D", "e"]
+    participants = [models.Participant.objects.create(label=label) for label in labels]
+    for participant in participants[1:]:
+        models.TaskAssignment.objects.create(participant=participant, task=task)
+
+    def get_results(chunk_size):
+        data = json.loads(
+            b"".join(export.iter_experiment_results(experiment, chunk_size))
+        )
+        return [
+            (result["participant"]["label"], len(result["tasks"]))
+            for result in data["results"]
+            if result["participant"]["label"] in labels
+        ]
+
+    response = staff_authenticated_client.get(f"/experiments/{experiment.id}/results")
+    data = json.loads(b"".join(response.streaming_content))
+    results = {
+        result["participant"]["label"]: len(result["tasks"])
+        for result in data["results"]
+    }
+    assert {label: results[label] for label in labels} == {
+        "a": 0,
+        "B": 1,
+        "c": 1,
+        "D": 1,
+        "e": 1,
+    }
+
+    # Labels ordered by a case-insensitive collation (as on PostgreSQL)
+    order_by = models.Participant.objects.order_by
+    with mock.patch.object(
+        models.Participant.objects,
+        "order_by",
+        lambda *fields: order_by(Lower("label"), "id"),
+    ):
+        for chunk_size in [1, 2, 100]:
+            assert get_results(chunk_size) == [
+                ("a", 0),
+                ("B", 1),
+                ("c", 1),
+                ("D", 1),
+                ("e", 1),
+            ]
+
+
+def test_get_experiment_results_since(
+    staff_authenticated_client, settings, experiments, registered_participant
+):
+    settings.RESULTS_EXPORT_SETTLE_TIME = 0
+    experiment = experiments[0]
+    url = f"/experiments/{experiment.id}/results"
+
+    def get_results(since):
+        response = staff_authenticated_client.get(url, {"since": since})
+        assert response.status_code == 200
+        return json.loads(b"".join(response.streaming_content))
+
+    data = get_results("")
+    assert data["results"] == []
+    assert data["cursor"] == ""
+
+    experiment.start_task(registered_participant).finish(
+        registered_participant, {"events": []}
+    )
+    data = get_results("")
+    [result] = data["results"]
+    assert result["participant"]["id"] == str(registered_participant.id)
+    assert result["practice"] is False
+    assert result["results"] == {"events": []}
+    cursor = data["cursor"]
+    assert get_results(cursor) == {
+        "experiment": data["experiment"],
+        "results": [],
+        "cursor": cursor,
+    }
+
+    experiment.start_task(registered_participant, practice=True).finish(
+        registered_participant, {}
+    )
+    data = get_results(cursor)
+    assert [result["practice"] for result in data["results"]] == [True]
+    assert data["cursor"] > cursor
+
+    settings.RESULTS_EXPORT_SETTLE_TIME = 60
+    assert get_results("")["results"] == []
+    assert staff_authenticated_client.get(url, {"since": "now"}).status_code == 400
+
+
+def test_get_experiment_events(
+    staff_authenticated_client, experiments, registered_participant
+):
+    experiment = experiments[0]
+    experiment.start_task(registered_participant).finish(
+        registered_participant,
+        {
+            "events": [
+                {"time": "2023-01-01T10:59:59.500Z", "label": "start", "data": None},
+                {
+                    "time": "2023-01-01T11:00:01Z",
+                    "label": "answer",
+                    "data": {"answer": 2, "correct": True},
+                },
+                {
+                    "time": "2023-01-01T12:00:02.250+01:00",
+                    "label": "finish",
+                    "data": [1, 2],
+                },
+            ]
+        },
+    )
+
+    response = staff_authenticated_client.get(
+        f"/experiments/{experiment.id}/events.csv?download"
+    )
+    assert response.status_code == 200
+    assert response["Content-Type"] == "text/csv"
+    rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+    assert rows[0][-3:] == ["data.answer", "data.correct", "data"]
+    assert [row[6:] for row in rows[1:]] == [
+        ["start", "2023-01-01T10:59:59.500Z", "0.0", "", "", ""],
+        ["answer", "2023-01-01T11:00:01Z", "1.5", "2", "true", ""],
+        ["finish", "2023-01-01T12:00:02.250+01:00", "2.75", "", "", "[1,2]"],
+    ]
+    assert all(row[0] == str(registered_participant.id) for row in rows[1:])
+
+    response = staff_authenticated_client.get(
+        f"/experiments/{experiment.id}/events.tsv"
+    )
+    content = b"".join(response.streaming_content).decode()
+    assert content.splitlines()[2].split("\t")[6] == "answer"
+    response = staff_authenticated_client.get(
+        f"/experiments/{experiment.id}/events.xml"
+    )
+    assert response.status_code == 404
+
+
+def test_get_experiment_results_graph(
+    staff_authenticated_client, experiments, registered_participant
+):
+    experiment = experiments[0]
+    # Canceled by starting the next task
+    experiment.start_task(registered_participant, practice=True)
+    experiment.start_task(registered_participant).finish(
+        registered_participant,
+        {
+            "events": [
+                {
+                    "time": f"2023-01-01T10:{i // 60000:02}:{i // 1000 % 60:02}."
+                    f"{i % 1000:03}Z",
+                    "label": "scroll" if i % 2 else "tap",
+                }
+                for i in range(0, 100000, 10)
+            ]
+        },
+    )
+    url = f"/experiments/{experiment.id}/results/{registered_participant.id}/graph"
+
+    with mock.patch.object(
+        models.TaskAssignment,
+        "get_results",
+        autospec=True,
+        side_effect=models.TaskAssignment.get_results,
+    ) as get_results:
+        response = staff_authenticated_client.get(url)
+        assert response.status_code == 200, response.content
+        assert get_results.call_count == 1
+        content = response.content.decode()
+        # Downsampled to one point per label and pixel range
+        assert content.count("<circle") <= 2 * timeline.MAX_POINTS
+        assert "10000 events" in content
+        assert content.count(f'fill="{timeline.get_label_color("tap")}"') > 1
+        assert content.count('class="card-title"') == 1
+        assert "(practice)" not in content
+
+        response = staff_authenticated_client.get(url)
+        assert response.content.decode() == content
+        assert get_results.call_count == 1
 
 
 def test_get_experiment_list(staff_authenticated_client, experiments):
@@ -178,6 +519,101 @@ def test_get_experiment_detail(staff_authenticated_client, experiments):
             assert escapejs(str(rating.id)) in response.content.decode()
 
 
+def test_get_experiment_detail_script_name(staff_authenticated_client, experiments):
+    experiment = experiments[0]
+    set_script_prefix("/okra/")
+    try:
+        response = staff_authenticated_client.get(f"/experiments/{experiment.id}")
+    finally:
+        set_script_prefix("/")
+    assert response.status_code == 200, response.content
+    # Task data and assignments are loaded from URLs with the script prefix
+    for url in ["assignments", "tasks"]:
+        assert (
+            escapejs(json.dumps(f"/okra/experiments/{experiment.id}/{url}"))
+            in response.content.decode()
+        )
+
+
+def test_get_experiment_detail_lazy(
+    settings, staff_authenticated_client, experiments, registered_participant
+):
+    settings.EDITOR_PAGE_SIZE = 2
+    experiment = experiments[0]
+    url = f"/experiments/{experiment.id}"
+    with CaptureQueriesContext(connection) as queries:
+        response = staff_authenticated_client.get(url)
+    task = experiment.tasks.get()
+    assert escapejs(str(task.id)) in response.content.decode()
+
+    for i in range(3):
+        participant = models.Participant.objects.create(label=f"group-{i}")
+        models.TaskAssignment.objects.create(
+            participant=participant,
+            task=models.Task.objects.create(experiment=experiment, data={"i": i}),
+        )
+    with CaptureQueriesContext(connection) as more_queries:
+        staff_authenticated_client.get(url)
+    assert len(more_queries) == len(queries)
+
+    response = staff_authenticated_client.get(f"{url}/assignments", {"page": 2})
+    assert response.status_code == 200, response.content
+    assert response.json()["nPages"] == 2
+    assert response.json()["nParticipants"] == 4
+    # Ordered by label ("unlabeled" last)
+    [participant, _] = response.json()["participants"]
+    assert participant["label"] == "group-2"
+    assert len(participant["assignments"]) == 1
+    assert participant["assignments"][0]["started"] is False
+
+    response = staff_authenticated_client.get(f"{url}/tasks", {"id": [str(task.id)]})
+    assert response.status_code == 200, response.content
+    assert response.json()["tasks"] == [
+        {"id": str(task.id), "label": task.label, "data": {}}
+    ]
+    task_ids = [str(task.id) for task in experiment.tasks.all()]
+    assert (
+        staff_authenticated_client.get(f"{url}/tasks", {"id": task_ids}).status_code
+        == 400
+    )
+
+
+def test_post_experiment_detail_without_task_data(
+    staff_authenticated_client, experiments
+):
+    experiment = experiments[1]
+    task = experiment.tasks.get()
+    task.set_data({"loaded": False})
+    task.save()
+    data = {
+        "taskType": experiment.task_type,
+        "title": experiment.title,
+        "instructions": experiment.instructions,
+        "instructionsAfterTask": "",
+        "instructionsAfterPracticeTask": "",
+        "instructionsAfterFinalTask": "",
+        "practiceTask": None,
+        "tasks": [{"id": str(task.id), "label": "New label"}],
+        "ratings": [],
+        "assignments": {},
+    }
+    response = staff_authenticated_client.post(
+        f"/experiments/{experiment.id}", data, content_type="application/json"
+    )
+    assert response.status_code == 200, response.content
+    task.refresh_from_db()
+    assert task.label == "New label"
+    assert task.get_data() == {"loaded": False}
+    # Assignments of participants that were not loaded are kept
+    assert task.assignments.count() == 1
+
+    data["tasks"].append({"label": "New task"})
+    response = staff_authenticated_client.post(
+        f"/experiments/{experiment.id}", data, content_type="application/json"
+    )
+    assert response.status_code == 400
+
+
 def test_post_experiment_detail(staff_authenticated_client, experiments):
     for experiment in experiments:
         data = {
@@ -259,6 +695,56 @@ def test_post_experiment_detail(staff_authenticated_client, experiments):
             )
 
 
+def test_post_experiment_detail_deduplicated_data(
+    settings, staff_authenticated_client, experiments
+):
+    settings.TASK_DATA_STORAGE = "deduplicated"
+    experiment = experiments[0]
+
+    def post(tasks_data):
+        data = {
+            "taskType": experiment.task_type,
+            "title": experiment.title,
+            "instructions": experiment.instructions,
+            "instructionsAfterTask": "",
+            "instructionsAfterPracticeTask": "",
+            "instructionsAfterFinalTask": "",
+            "practiceTask": None,
+            "tasks": [
+                {"label": f"Task {i}", "data": task_data}
+                for i, task_data in enumerate(tasks_data)
+            ],
+            "ratings": [],
+            "assignments": {},
+        }
+        response = staff_authenticated_client.post(
+            f"/experiments/{experiment.id}", data, content_type="application/json"
+        )
+        assert response.status_code == 200, response.content
+
+    post([{"text": "Same", "questions": [1]}, {"questions": [1], "text": "Same"}])
+    assert models.TaskData.objects.count() == 1
+    for task in experiment.tasks.all():
+        assert task.data is None
+        assert task.get_data() == {"text": "Same", "questions": [1]}
+    response = staff_authenticated_client.get(
+        f"/experiments/{experiment.id}/tasks",
+        {"id": [str(task.id) for task in experiment.tasks.all()]},
+    )
+    assert [task["data"] for task in response.json()["tasks"]] == [
+        {"text": "Same", "questions": [1]}
+    ] * 2
+
+    post([{"text": "Same", "questions": [1]}, {"text": "Other"}])
+    assert models.TaskData.objects.count() == 2
+    post([{"text": "New"}])
+    assert [task_data.data for task_data in models.TaskData.objects.all()] == [
+        {"text": "New"}
+    ]
+    experiment.delete()
+    assert not models.TaskData.objects.exists()
+
+
 def test_post_experiment_detail_clear(staff_authenticated_client, experiments):
     for experiment in experiments:
         data = {
@@ -291,6 +777,64 @@ def test_post_experiment_detail_clear(staff_authenticated_client, experiments):
             assert experiment.get_assignments(participant).count() == 0
 
 
+def test_post_experiment_detail_rating_ids(staff_authenticated_client, experiments):
+    experiment = experiments[0]
+    rating = models.TaskRating.objects.create(
+        experiment=experiment, question="Rating", rating_type="slider"
+    )
+    other_rating = experiments[1].ratings.get()
+
+    def save(*rating_ids):
+        data = {
+            "taskType": experiment.task_type,
+            "title": experiment.title,
+            "instructions": experiment.instructions,
+            "instructionsAfterTask": "",
+            "instructionsAfterPracticeTask": "",
+            "instructionsAfterFinalTask": "",
+            "practiceTask": None,
+            "tasks": [
+                {"id": str(task.id), "label": task.label}
+                for task in experiment.tasks.all()
+            ],
+            "ratings": [
+                {
+                    "id": rating_id and str(rating_id),
+                    "question": "New rating",
+                    "type": "emoticon",
+                    "lowExtreme": None,
+                    "highExtreme": None,
+                }
+                for rating_id in rating_ids
+            ],
+            "assignments": {},
+        }
+        return staff_authenticated_client.post(
+            f"/experiments/{experiment.id}", data, content_type="application/json"
+        )
+
+    # Ratings of other experiments are not taken over
+    response = save(rating.id, other_rating.id)
+    assert response.status_code == 400, response.content
+    assert response.json() == {"message": "Rating ID of another experiment"}
+    response = save(rating.id, rating.id)
+    assert response.status_code == 400, response.content
+    other_rating.refresh_from_db()
+    assert other_rating.experiment == experiments[1]
+    assert experiment.ratings.get() == rating
+
+    # Existing ratings are updated in place, new ones are added after them
+    response = save(rating.id, None)
+    assert response.status_code == 200, response.content
+    ratings = list(experiment.ratings.all())
+    assert len(ratings) == 2
+    assert rating in ratings
+    assert {rating.question for rating in ratings} == {"New rating"}
+    response = save(None)
+    assert response.status_code == 200, response.content
+    assert rating not in experiment.ratings.all()
+
+
 def test_post_experiment_detail_new_with_ids(
     staff_authenticated_client, unregistered_participant, registered_participant
 ):
@@ -482,6 +1026,138 @@ def test_post_experiment_detail_missing_key(staff_authenticated_client, experime
             assert response.json() == {"message": f"Missing key: {key!r}"}
 
 
+def test_post_experiment_detail_cyclic_requirements(
+    staff_authenticated_client, experiments
+):
+    experiments[1].set_required_experiments([experiments[0].id])
+    data = {
+        "taskType": "reading",
+        "title": "",
+        "instructions": "",
+        "instructionsAfterTask": None,
+        "instructionsAfterPracticeTask": None,
+        "instructionsAfterFinalTask": None,
+        "practiceTask": None,
+        "tasks": [],
+        "ratings": [],
+        "requirements": [str(experiments[1].id)],
+        "assignments": {},
+    }
+    response = staff_authenticated_client.post(
+        f"/experiments/{experiments[0].id}", data, content_type="application/json"
+    )
+    assert response.status_code == 400, response.content
+    assert response.json() == {"message": "Cyclic requirements"}
+    assert experiments[0].required_experiments.count() == 0
+
+
+def test_post_experiment_detail_bulk(staff_authenticated_client, experiments):
+    experiment = experiments[0]
+    participants = models.Participant.create_batch(10, "bulk-")
+    task_ids = [str(uuid4()) for _ in range(10)]
+
+    def save(n_tasks, n_participants, n_assigned=None, reverse=False):
+        task_labels = [f"task-{i}" for i in range(n_tasks)]
+        assigned_labels = task_labels[:n_assigned]
+        data = {
+            "taskType": experiment.task_type,
+            "title": experiment.title,
+            "instructions": experiment.instructions,
+            "instructionsAfterTask": "",
+            "instructionsAfterPracticeTask": "",
+            "instructionsAfterFinalTask": "",
+            "practiceTask": None,
+            "tasks": [
+                {"id": task_id, "label": label, "data": {"label": label}}
+                for task_id, label in zip(task_ids, task_labels)
+            ],
+            "ratings": [],
+            "assignments": {
+                str(participant.id): [
+                    {"label": label}
+                    for label in (assigned_labels[::-1] if reverse else assigned_labels)
+                ]
+                for participant in participants[:n_participants]
+            },
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = staff_authenticated_client.post(
+                f"/experiments/{experiment.id}", data, content_type="application/json"
+            )
+        assert response.status_code == 200, response.content
+        executed[:] = [query["sql"] for query in queries.captured_queries]
+        return len(queries)
+
+    executed = []
+
+    save(2, 2)
+    n_queries = save(2, 2)
+    save(10, 10)
+    assignment_ids = set(
+        models.TaskAssignment.objects.filter(participant__in=participants).values_list(
+            "id", flat=True
+        )
+    )
+    # Saving without changes takes the same number of queries for any size
+    assert save(10, 10) == n_queries
+    # and writes no tasks
+    assert not any('UPDATE "okra_server_task"' in sql for sql in executed)
+    assert (
+        set(
+            models.TaskAssignment.objects.filter(
+                participant__in=participants
+            ).values_list("id", flat=True)
+        )
+        == assignment_ids
+    )
+
+    # Removing assignments takes the same number of queries for any number of them
+    n_queries = save(10, 10, n_assigned=9)
+    assert save(10, 10, n_assigned=4) == n_queries
+    for participant in participants:
+        assert experiment.get_n_tasks(participant) == 4
+        assert experiment.get_assignments(participant).count() == 4
+
+    save(10, 10, reverse=True)
+    for participant in participants:
+        assert [
+            assignment.task.label
+            for assignment in experiment.get_assignments(participant).order_by("id")
+        ] == [f"task-{i}" for i in reversed(range(10))]
+        assert experiment.get_n_tasks(participant) == 10
+        assert experiment.get_n_tasks(participant, started=True) == 0
+
+
+def test_post_experiment_detail_invalid_assignments(
+    staff_authenticated_client, experiments, registered_participant
+):
+    experiment = experiments[0]
+    data = {
+        "taskType": experiment.task_type,
+        "title": "New title",
+        "instructions": experiment.instructions,
+        "instructionsAfterTask": "",
+        "instructionsAfterPracticeTask": "",
+        "instructionsAfterFinalTask": "",
+        "practiceTask": None,
+        "tasks": [{"label": "New task", "data": {}}],
+        "ratings": [],
+        "assignments": {
+            str(registered_participant.id): [{"label": "Unknown task"}],
+        },
+    }
+    response = staff_authenticated_client.post(
+        f"/experiments/{experiment.id}", data, content_type="application/json"
+    )
+    assert response.status_code == 400, response.content
+    assert response.json() == {"message": "Unknown task 'Unknown task'"}
+    # Nothing is saved
+    experiment.refresh_from_db()
+    assert experiment.title == "Test experiment"
+    assert not experiment.tasks.filter(label="New task").exists()
+    assert experiment.get_n_tasks(registered_participant) == 1
+
+
 def test_post_experiment_visibility(authenticated_client, experiments):
     for experiment in experiments:
         assert not experiment.visible
@@ -499,6 +1175,38 @@ def test_post_delete_experiment(staff_authenticated_client, experiments):
             models.Experiment.objects.get(id=experiment.id)
 
 
+def test_post_delete_experiment_queries(settings, staff_authenticated_client):
+    settings.TASK_DATA_STORAGE = "deduplicated"
+
+    def delete_experiment(n_participants, n_tasks):
+        experiment = models.Experiment.objects.create(
+            practice_task=models.Task.objects.create(data={})
+        )
+        tasks = []
+        for i in range(n_tasks):
+            task = models.Task(experiment=experiment)
+            task.set_data({"text": f"Task {i}"})
+            task.save()
+            tasks.append(task)
+        for participant in models.Participant.create_batch(n_participants):
+            for task in [experiment.practice_task] + tasks:
+                models.TaskAssignment.objects.create(participant=participant, task=task)
+        with CaptureQueriesContext(connection) as queries:
+            response = staff_authenticated_client.post(
+                f"/experiments/{experiment.id}/delete"
+            )
+        assert response.status_code == 302
+        assert not models.ProgressCounter.objects.filter(experiment=experiment).exists()
+        assert not models.TaskData.objects.filter(
+            hash__in=[task.shared_data_id for task in tasks]
+        ).exists()
+        return len(queries)
+
+    # Deleting tasks and assignments (by cascade) takes the same number of queries,
+    # apart from Django deleting assignments in batches of 100
+    assert delete_experiment(20, 10) <= delete_experiment(2, 2) + 220 // 100
+
+
 def test_get_participant_list(
     authenticated_client, unregistered_participant, registered_participant
 ):
@@ -521,6 +1229,61 @@ def test_get_participant_list_authenticated(
     assert response.content.decode().count('data-bs-target="#delete-modal"') == 2
 
 
+def test_post_new_participants(
+    staff_authenticated_client, unregistered_participant, registered_participant
+):
+    response = staff_authenticated_client.post(
+        "/participants/new-batch", {"n": 12, "label_prefix": "cohort-a-"}
+    )
+    assert response.status_code == 302, response.content
+    participants = models.Participant.objects.filter(label__startswith="cohort-a-")
+    assert [participant.label for participant in participants] == [
+        f"cohort-a-{i:02}" for i in range(1, 13)
+    ]
+    assert len({participant.registration_key for participant in participants}) == 12
+
+    response = staff_authenticated_client.get(response.url)
+    assert response.status_code == 200, response.content
+    content = response.content.decode()
+    assert content.count('src="data:image/svg+xml;base64,') == 12
+    for participant in participants:
+        assert participant.registration_key in content
+    assert unregistered_participant.registration_key not in content
+
+    for data in [{"n": 0}, {"n": "many"}, {"n": 1, "label_prefix": "x" * 50}]:
+        response = staff_authenticated_client.post("/participants/new-batch", data)
+        assert response.status_code == 400, response.content
+
+
+def test_create_participants_command(capsys):
+    call_command("createparticipants", "3", "-l", "p", "-u", "https://host/api/")
+    sheet = capsys.readouterr().out
+    assert sheet.count("<img") == 3
+    for participant in models.Participant.objects.filter(label__startswith="p"):
+        assert participant.label in ["p1", "p2", "p3"]
+        assert participant.registration_key in sheet
+    assert "https://host/api<" in sheet
+
+    # Numbering continues after existing participants with the prefix
+    call_command("createparticipants", "2", "-l", "p", "-u", "https://host/api/")
+    assert sorted(
+        models.Participant.objects.filter(label__startswith="p").values_list(
+            "label", flat=True
+        )
+    ) == ["p1", "p2", "p3", "p4", "p5"]
+
+
+def test_render_qr_codes_parallel():
+    data = [f"https://host/api\n{uuid4()}\nkey" for _ in range(3)]
+    assert qr.get_qr_codes(data, "png", parallel=True, min_parallel=1) == [
+        qr.render_qr_code(item, "png") for item in data
+    ]
+    # Without `parallel` (in web requests), no processes are started
+    with mock.patch.object(qr, "ProcessPoolExecutor") as executor:
+        qr.get_qr_codes([f"https://host/api\n{uuid4()}\nkey"], "png", min_parallel=1)
+    executor.assert_not_called()
+
+
 def test_post_label_participant(staff_authenticated_client, unregistered_participant):
     assert unregistered_participant.label == "unlabeled"
     staff_authenticated_client.post(
@@ -553,3 +1316,33 @@ def test_post_delete_participant(
     staff_authenticated_client.post(f"/participants/{registered_participant.id}/delete")
     with pytest.raises(models.Participant.DoesNotExist):
         models.Participant.objects.get(id=registered_participant.id)
+
+
+def test_post_delete_participant_queries(
+    settings, staff_authenticated_client, experiments
+):
+    settings.RESULTS_STORAGE = "compressed"
+
+    def delete_participant(n_tasks):
+        participant = models.Participant.objects.create()
+        for _ in range(n_tasks):
+            models.TaskAssignment.objects.create(
+                participant=participant,
+                task=models.Task.objects.create(experiment=experiments[0], data={}),
+            ).finish({"answers": [1]})
+        with CaptureQueriesContext(connection) as queries:
+            response = staff_authenticated_client.post(
+                f"/participants/{participant.id}/delete"
+            )
+        assert response.status_code == 302
+        assert not models.TaskAssignment.objects.filter(
+            participant_id=participant.id
+        ).exists()
+        assert not models.TaskAssignmentResults.objects.filter(
+            assignment__participant_id=participant.id
+        ).exists()
+        return len(queries)
+
+    # Deleting assignments and their results takes the same number of queries,
+    # apart from Django deleting assignments in batches of 100
+    assert delete_participant(200) <= delete_participant(2) + 200 // 100